@@ -1,38 +1,250 @@
+import argparse
+import hashlib
+import json
 import os
 import shutil
-from sklearn.model_selection import train_test_split
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-# Define paths
-YAWN_DATASET_PATH = r"C:\driver-drowsiness\yawn_dataset"  # Update this to your actual path
-NEW_DATASET_PATH = r"C:\driver-drowsiness\yawning_dataset"  # Where the split dataset will be stored
-
-# Categories
+# Categories (the 4-class drowsiness dataset used by model.py is picked up automatically with --categories auto)
 CATEGORIES = ["yawn", "no_yawn"]
+SPLITS = [("train", 0.8), ("test", 0.1), ("validation", 0.1)]
+IMAGE_EXTENSIONS = (".jpg", ".png", ".jpeg")
+LINK_MODES = ("copy", "hardlink", "reflink")
+MANIFEST_NAME = "manifest.json"
+MANIFEST_SAVE_EVERY = 1000  # Files between incremental manifest saves
+FICLONE = 0x40049409  # Linux ioctl for copy-on-write clones (btrfs, XFS)
+NEAR_DUPLICATE_BITS = 4  # dHashes at most this many bits apart are the same frame
+
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def perceptual_hash(path):
+    # 64-bit difference hash: near-identical frames (re-encodes, tiny lighting changes) differ in a few bits at most
+    from PIL import Image
+
+    with Image.open(path) as img:
+        pixels = list(img.convert("L").resize((9, 8)).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+
+class NearDuplicateIndex:
+    # Groups 64-bit dHashes by Hamming distance. Each hash is cut into max_bits + 1 bands: two hashes
+    # within max_bits differ in at most max_bits bands, so they match exactly in at least one, and
+    # only hashes sharing a band are compared. A hash joins the first group it is close to.
+    def __init__(self, max_bits=NEAR_DUPLICATE_BITS):
+        self.max_bits = max_bits
+        self.bands = max_bits + 1
+        self.width = -(-64 // self.bands)
+        self._buckets = {}
+
+    def _bands(self, value):
+        return [(i, (value >> (i * self.width)) & ((1 << self.width) - 1)) for i in range(self.bands)]
+
+    def add(self, group):
+        value = int(group, 16)
+        for band in self._bands(value):
+            self._buckets.setdefault(band, []).append(value)
+
+    def find(self, phash):
+        # Group key of an existing group within max_bits, or a new group keyed by this hash
+        value = int(phash, 16)
+        for band in self._bands(value):
+            for other in self._buckets.get(band, ()):
+                if bin(value ^ other).count("1") <= self.max_bits:
+                    return f"{other:016x}"
+        self.add(phash)
+        return phash
+
+
+def assign_split(group_key):
+    # Deterministic from the group key: reruns and new files never move existing images,
+    # and every member of a duplicate group lands in the same split
+    position = int(hashlib.sha1(group_key.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+    cumulative = 0.0
+    for split, fraction in SPLITS:
+        cumulative += fraction
+        if position < cumulative:
+            return split
+    return SPLITS[-1][0]
+
+
+def place_file(src, dst, mode):
+    if os.path.exists(dst):
+        return
+    if mode == "hardlink":
+        try:
+            os.link(src, dst)
+            return
+        except OSError:
+            pass  # Different filesystem or no hardlink support
+    elif mode == "reflink":
+        try:
+            import fcntl
+
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return
+        except (ImportError, OSError):
+            if os.path.exists(dst):
+                os.remove(dst)
+    shutil.copy2(src, dst)
+
+
+class Manifest:
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.files = json.load(f)["files"]
+        self._lock = threading.Lock()
+        self._pending = 0
+
+    def get(self, key):
+        return self.files.get(key)
+
+    def add(self, key, entry):
+        with self._lock:
+            self.files[key] = entry
+            self._pending += 1
+            if self._pending >= MANIFEST_SAVE_EVERY:
+                self._save_locked()
+
+    def save(self):
+        with self._lock:
+            self._save_locked()
+
+    def _save_locked(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"files": self.files}, f)
+        os.replace(tmp_path, self.path)
+        self._pending = 0
+
+
+def detect_categories(source):
+    return sorted(d for d in os.listdir(source) if os.path.isdir(os.path.join(source, d)))
+
+
+def organize(source, dest, categories, mode="copy", workers=None, near_duplicates=False):
+    os.makedirs(dest, exist_ok=True)
+    manifest = Manifest(os.path.join(dest, MANIFEST_NAME))
+
+    # Create train, test, and validation folders
+    for split, _ in SPLITS:
+        for category in categories:
+            os.makedirs(os.path.join(dest, split, category), exist_ok=True)
+
+    jobs = []
+    for category in categories:
+        source_folder = os.path.join(source, category)
+        for name in os.listdir(source_folder):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                jobs.append((category, name, os.path.join(source_folder, name)))
+
+    # Unchanged files (same size and mtime as recorded) are skipped without re-hashing
+    def is_current(job):
+        category, name, path = job
+        entry = manifest.get(f"{category}/{name}")
+        stat = os.stat(path)
+        return entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime
+
+    with ThreadPoolExecutor(workers) as pool:
+        current = list(pool.map(is_current, jobs))
+        new_jobs = [job for job, done in zip(jobs, current) if not done]
+        print(f"📂 {len(jobs)} images found, {len(new_jobs)} new or changed")
+
+        hashes = list(pool.map(lambda job: file_hash(job[2]), new_jobs))
+        if near_duplicates:
+            groups = list(pool.map(lambda job: perceptual_hash(job[2]), new_jobs))
+        else:
+            groups = hashes
+
+        # Exact duplicates already placed (this run or earlier) in the same category are recorded but
+        # not placed again. The same image under two categories is a label conflict: both are kept.
+        seen = {(key.split("/")[0], entry["hash"]): key for key, entry in manifest.files.items()
+                if not entry.get("duplicate_of")}
+        hash_categories = {}
+        for category, content_hash in seen:
+            hash_categories.setdefault(content_hash, set()).add(category)
+        # Near-duplicate groups already split keep their split
+        group_splits = {entry["group"]: entry["split"] for entry in manifest.files.values()}
+        if near_duplicates:
+            index = NearDuplicateIndex()
+            for group in group_splits:
+                if len(group) == 16:  # dHash groups from earlier --near-duplicates runs (not SHA-1s)
+                    index.add(group)
+        placements = []
+        for (category, name, path), content_hash, group in zip(new_jobs, hashes, groups):
+            key = f"{category}/{name}"
+            stat = os.stat(path)
+            previous = manifest.get(key)
+            if previous and not previous.get("duplicate_of"):
+                # Changed file: remove the stale placement before re-placing it
+                stale = os.path.join(dest, previous["split"], category, name)
+                if os.path.exists(stale):
+                    os.remove(stale)
+            if near_duplicates:
+                group = index.find(group)
+            split = group_splits.setdefault(group, assign_split(group))
+            entry = {"hash": content_hash, "group": group, "split": split, "size": stat.st_size,
+                     "mtime": stat.st_mtime}
+            if seen.get((category, content_hash), key) != key:
+                entry["duplicate_of"] = seen[(category, content_hash)]
+                manifest.add(key, entry)
+                continue
+            seen[(category, content_hash)] = key
+            hash_categories.setdefault(content_hash, set()).add(category)
+            placements.append((path, os.path.join(dest, split, category, name), key, entry))
+
+        def place(item):
+            path, target, key, entry = item
+            place_file(path, target, mode)
+            manifest.add(key, entry)
+
+        list(pool.map(place, placements))
+
+    manifest.save()
+    duplicates = len(new_jobs) - len(placements)
+    print(f"✅ Placed {len(placements)} images ({mode}), skipped {duplicates} duplicates")
+    conflicts = [content_hash for content_hash, found_in in hash_categories.items() if len(found_in) > 1]
+    if conflicts:
+        print(f"⚠️ {len(conflicts)} images are filed under more than one category (kept in each):")
+        for content_hash in conflicts[:10]:
+            print(f"   {', '.join(sorted(key for (_, h), key in seen.items() if h == content_hash))}")
+    for split, _ in SPLITS:
+        count = sum(1 for e in manifest.files.values() if e["split"] == split and not e.get("duplicate_of"))
+        print(f"   {split}: {count}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Split an image dataset into train/test/validation folders")
+    parser.add_argument("--source", required=True, help="Folder with one sub-folder per category")
+    parser.add_argument("--dest", required=True, help="Where the split dataset will be stored")
+    parser.add_argument("--categories", nargs="+", default=CATEGORIES,
+                        help="Category folders to split, or 'auto' for every sub-folder of --source")
+    parser.add_argument("--mode", choices=LINK_MODES, default="copy",
+                        help="hardlink/reflink avoid duplicating data on disk (falls back to copy)")
+    parser.add_argument("--workers", type=int, help="I/O threads (default: Python's ThreadPoolExecutor default)")
+    parser.add_argument("--near-duplicates", action="store_true",
+                        help=f"Group frames whose perceptual hashes differ in at most {NEAR_DUPLICATE_BITS} bits "
+                             "so they share a split")
+    return parser.parse_args()
+
 
-# Create train, test, and validation folders
-for split in ["train", "test", "validation"]:
-    for category in CATEGORIES:
-        os.makedirs(os.path.join(NEW_DATASET_PATH, split, category), exist_ok=True)
-
-# Function to split and copy images
-def split_and_move(category):
-    source_folder = os.path.join(YAWN_DATASET_PATH, category)
-    images = [f for f in os.listdir(source_folder) if f.endswith(('.jpg', '.png', '.jpeg'))]
-
-    # Split into train (80%), test (10%), validation (10%)
-    train, test = train_test_split(images, test_size=0.2, random_state=42)
-    test, val = train_test_split(test, test_size=0.5, random_state=42)
-
-    # Copy files to respective folders
-    for img in train:
-        shutil.copy(os.path.join(source_folder, img), os.path.join(NEW_DATASET_PATH, "train", category))
-    for img in test:
-        shutil.copy(os.path.join(source_folder, img), os.path.join(NEW_DATASET_PATH, "test", category))
-    for img in val:
-        shutil.copy(os.path.join(source_folder, img), os.path.join(NEW_DATASET_PATH, "validation", category))
-
-# Process each category
-for category in CATEGORIES:
-    split_and_move(category)
-
-print("✅ Yawning dataset split successfully!")
+if __name__ == "__main__":
+    args = parse_args()
+    categories = detect_categories(args.source) if args.categories == ["auto"] else args.categories
+    organize(args.source, args.dest, categories, args.mode, args.workers, args.near_duplicates)
+    print("✅ Dataset split successfully!")
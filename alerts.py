@@ -0,0 +1,84 @@
+import time
+
+from metrics import RollingStats
+
+ALERT_SOUND = "Assets/alert2.mp3"
+MIXER_FREQUENCY = 44100
+MIXER_BUFFER = 256  # Samples per mixer buffer: ~6 ms at 44.1 kHz (pygame's default 512 is ~12 ms)
+ALERT_CHANNEL = 0  # Reserved, so nothing else can take it or cut an alert short
+ESCALATION_WINDOW = 30.0  # Alerts closer together than this escalate; a quiet gap resets to the first level
+# Consecutive alerts within the window step through these: louder, and repeated back to back
+ESCALATION_LEVELS = [
+    {"volume": 0.5, "loops": 0},
+    {"volume": 0.8, "loops": 1},
+    {"volume": 1.0, "loops": 3},
+]
+
+
+class AlertEngine:
+    # The sound is decoded once into a mixer Sound and played on a dedicated channel.
+    # play() returns immediately, so there is no polling thread per alert.
+    def __init__(self, sound_path=ALERT_SOUND, levels=ESCALATION_LEVELS, escalation_window=ESCALATION_WINDOW,
+                 profiler=None):
+        import pygame
+
+        if not pygame.mixer.get_init():
+            pygame.mixer.init(MIXER_FREQUENCY, buffer=MIXER_BUFFER)
+        pygame.mixer.set_reserved(ALERT_CHANNEL + 1)
+        self.channel = pygame.mixer.Channel(ALERT_CHANNEL)
+        self.sound = pygame.mixer.Sound(sound_path)
+        frequency = pygame.mixer.get_init()[0]
+        self.output_latency = MIXER_BUFFER / frequency  # Nominal time for the first buffer to reach the device
+        self.levels = levels
+        self.escalation_window = escalation_window
+        self.profiler = profiler
+        self.level = -1
+        self.alerts = 0
+        self.last_alert_time = None
+        # Estimated dispatch latency: time until play() hands the sound to the mixer, plus one mixer
+        # buffer. pygame can't report when the device actually starts playing, so this is not measured.
+        self.latency = RollingStats()  # Trigger to estimated dispatch, seconds
+        self.capture_latency = RollingStats()  # Camera frame to estimated dispatch, seconds
+
+    def trigger(self, captured_at=None):
+        # captured_at: time.time() of the frame that raised the alert, if known
+        triggered = time.perf_counter()
+        if self.last_alert_time is not None and triggered - self.last_alert_time <= self.escalation_window:
+            self.level = min(self.level + 1, len(self.levels) - 1)
+        else:
+            self.level = 0
+        self.last_alert_time = triggered
+        level = self.levels[self.level]
+
+        self.channel.set_volume(level["volume"])
+        self.channel.play(self.sound, loops=level["loops"])
+        latency = time.perf_counter() - triggered + self.output_latency
+        self.latency.add(latency)
+        if captured_at is not None:
+            self.capture_latency.add(time.time() - captured_at + self.output_latency)
+        if self.profiler:
+            self.profiler.add("alert", latency)
+            self.profiler.set_gauge("alert_level", self.level)
+        self.alerts += 1
+        return latency
+
+    def stop(self):
+        # Session ended: cut any alert still playing and start the next session at the first level
+        self.channel.stop()
+        self.level = -1
+        self.last_alert_time = None
+
+    def summary(self):
+        if not self.alerts:
+            return "🔔 No alerts raised"
+        p50, p95, _ = (v * 1000 for v in self.latency.percentiles())
+        line = f"🔔 {self.alerts} alerts | estimated dispatch latency p50 {p50:.1f} ms, p95 {p95:.1f} ms"
+        if self.capture_latency.count:
+            line += f" | frame-to-dispatch p50 {self.capture_latency.percentiles((0.5,))[0] * 1000:.0f} ms"
+        return line
+
+    def close(self):
+        import pygame
+
+        self.channel.stop()
+        pygame.mixer.quit()
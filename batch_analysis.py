@@ -0,0 +1,205 @@
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from decision import PERCLOS_WINDOW
+from detection import MODEL_PATH, DrowsinessDetector
+from ear import batch_ear
+from frame_context import FrameContext
+from multitask import HEADS, drowsy_scores, is_multitask
+
+# Parquet output is optional; NPZ needs nothing beyond numpy
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+BATCH_SIZE = 16  # Frames per classifier call
+# Shards start this much early so eye-closure timers, cooldowns and the full PERCLOS window are
+# primed: a shard boundary must not reset PERCLOS, which needs up to a minute of history
+WARMUP_SECONDS = max(60.0, PERCLOS_WINDOW)
+STATUS_CODES = {"Non-Drowsy": 0, "Drowsy": 1, "Drowsy (Eyes Closed)": 2, "Drowsy (PERCLOS)": 3}
+EVENT_REASONS = {1: "model", 2: "eyes_closed", 3: "perclos"}
+
+
+def probe_video(path):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video: {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return fps, total_frames
+
+
+def plan_shards(total_frames, fps, workers, start=0.0, end=None):
+    first = int(start * fps)
+    last = total_frames if end is None else min(total_frames, int(end * fps))
+    if last <= first:
+        return []
+    size = math.ceil((last - first) / workers)
+    return [(s, min(s + size, last)) for s in range(first, last, size)]
+
+
+def analyze_shard(video_path, start_frame, end_frame, model_path=MODEL_PATH, backend=None, roi_mode="frame",
+                  batch_size=BATCH_SIZE):
+    detector = DrowsinessDetector(model_path, backend, roi_mode, audio=False)
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frame_idx = max(0, start_frame - int(WARMUP_SECONDS * fps))
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+
+    width, height = detector.input_size
+    contexts = [FrameContext(detector.input_size) for _ in range(batch_size)]
+    batch = np.zeros((batch_size, height, width, 3), dtype=np.float32)
+    rows = {"frame": [], "timestamp": [], "eye_points": [], "probs": [], "drowsy_by_model": [], "eyes_closed_long": [],
+            "status": []}
+    num_outputs = detector.backend.output_size
+    no_probs = np.full(num_outputs, np.nan, dtype=np.float32)
+    eye_indices = detector.eye_indices.ravel()
+    no_eyes = np.full((len(eye_indices), 2), np.nan, dtype=np.float32)
+
+    started = time.perf_counter()
+    ended = False
+    while frame_idx < end_frame and not ended:
+        # Landmarks frame by frame, then one classifier call for the whole chunk
+        chunk, chunk_eyes = [], []
+        while len(chunk) < batch_size and frame_idx < end_frame:
+            ctx = contexts[len(chunk)]
+            ret, ctx.raw = cap.read(ctx.raw)
+            if not ret:
+                ended = True
+                break
+            ctx.frame = ctx.raw
+            ctx.prepare(frame_idx, frame_idx / fps)  # Video time, not wall-clock time
+            detector.landmark_stage(ctx)
+            landmarks = detector.face_landmarks
+            chunk_eyes.append(no_eyes if landmarks is None else landmarks[eye_indices, :2])
+            chunk.append(ctx)
+            frame_idx += 1
+
+        # Warm-up frames only prime the timers; they don't need the CNN
+        targets = [ctx for ctx in chunk if ctx.face_box is not None and ctx.frame_id >= start_frame]
+        for i, ctx in enumerate(targets):
+            box = None if detector.roi_mode == "frame" else ctx.face_box
+            batch[i] = ctx.fill_input(box)[0]
+        if targets:
+            outputs = detector.backend.predict(batch[:len(targets)])
+            for ctx, prediction in zip(targets, outputs):
+                ctx.probs = prediction
+                ctx.drowsy_by_model = detector.interpret_prediction(prediction) == "Drowsy"
+
+        for ctx, eyes in zip(chunk, chunk_eyes):
+            status, _, _ = detector.update_status(ctx, ctx.captured_at)
+            if ctx.frame_id < start_frame:
+                continue
+            rows["frame"].append(ctx.frame_id)
+            rows["timestamp"].append(ctx.captured_at)
+            rows["eye_points"].append(eyes)
+            rows["probs"].append(no_probs if ctx.probs is None else ctx.probs)
+            rows["drowsy_by_model"].append(ctx.drowsy_by_model)
+            rows["eyes_closed_long"].append(ctx.eyes_closed_long)
+            rows["status"].append(STATUS_CODES.get(status, -1))
+
+    elapsed = time.perf_counter() - started
+    cap.release()
+    detector.close()
+
+    columns = {
+        "frame": np.array(rows["frame"], dtype=np.int64),
+        "timestamp": np.array(rows["timestamp"], dtype=np.float64),
+        # Eye landmarks are kept per frame and turned into EAR for the whole shard in one pass
+        "ear": batch_ear(np.array(rows["eye_points"], dtype=np.float32).reshape(-1, len(eye_indices), 2),
+                         np.arange(len(eye_indices)).reshape(detector.eye_indices.shape)).astype(np.float32),
+        "probs": np.array(rows["probs"], dtype=np.float32).reshape(-1, num_outputs),
+        "drowsy_by_model": np.array(rows["drowsy_by_model"], dtype=bool),
+        "eyes_closed_long": np.array(rows["eyes_closed_long"], dtype=bool),
+        "status": np.array(rows["status"], dtype=np.int8),
+    }
+    return columns, {"start_frame": start_frame, "frames": len(rows["frame"]), "seconds": elapsed}
+
+
+def merge_columns(parts):
+    return {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+
+def extract_events(columns):
+    drowsy = (columns["status"] > 0).astype(np.int8)
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], drowsy, [0]])))
+    drowsy_prob = drowsy_scores(columns["probs"])
+    events = []
+    for start, end in zip(edges[0::2], edges[1::2]):
+        span = slice(start, end)
+        event_probs = drowsy_prob[span]
+        event_ears = columns["ear"][span]
+        events.append({
+            "start_frame": int(columns["frame"][start]),
+            "end_frame": int(columns["frame"][end - 1]),
+            "start": float(columns["timestamp"][start]),
+            "end": float(columns["timestamp"][end - 1]),
+            "reason": EVENT_REASONS[int(columns["status"][span].min())],
+            "max_drowsy_prob": None if np.isnan(event_probs).all() else float(np.nanmax(event_probs)),
+            "min_ear": None if np.isnan(event_ears).all() else float(np.nanmin(event_ears)),
+        })
+    return events
+
+
+def write_columns(path, columns):
+    if path.endswith(".parquet"):
+        if pa is None:
+            raise ImportError("pyarrow is not installed. Run: pip install pyarrow (or use an .npz output)")
+        table = {key: value for key, value in columns.items() if key != "probs"}
+        probs = columns["probs"]
+        names = [f"p_{head}" for head in HEADS] if is_multitask(probs) else [f"p{i}" for i in range(probs.shape[1])]
+        for i, name in enumerate(names):
+            table[name] = probs[:, i]
+        pq.write_table(pa.table(table), path)
+    else:
+        np.savez_compressed(path, **columns)
+
+
+def run_batch_analysis(input_path, output_path, frames_output=None, model_path=MODEL_PATH, backend=None,
+                       roi_mode="frame", workers=None, start=0.0, end=None, batch_size=BATCH_SIZE):
+    fps, total_frames = probe_video(input_path)
+    workers = workers or os.cpu_count() or 1
+    shards = plan_shards(total_frames, fps, workers, start, end)
+    if not shards:
+        print("❌ Nothing to analyze in the requested time range.")
+        return None
+
+    print(f"🎞️ {input_path}: {total_frames} frames at {fps:.1f} FPS, {len(shards)} shard(s)")
+    started = time.perf_counter()
+    if len(shards) == 1:
+        results = [analyze_shard(input_path, *shards[0], model_path, backend, roi_mode, batch_size)]
+    else:
+        # spawn: TensorFlow and MediaPipe don't survive fork()
+        with ProcessPoolExecutor(len(shards), mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(analyze_shard, input_path, s, e, model_path, backend, roi_mode, batch_size)
+                       for s, e in shards]
+            results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - started
+
+    columns = merge_columns([columns for columns, _ in results])
+    events = extract_events(columns)
+    with open(output_path, "w") as f:
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+    frames_output = frames_output or os.path.splitext(output_path)[0] + "_frames.npz"
+    write_columns(frames_output, columns)
+
+    frames = len(columns["frame"])
+    for _, info in results:
+        shard_fps = info["frames"] / info["seconds"] if info["seconds"] else 0.0
+        print(f"   Shard from frame {info['start_frame']}: {info['frames']} frames, {shard_fps:.1f} frames/s")
+    print(f"⚡ Processed {frames} frames in {elapsed:.1f}s: {frames / elapsed:.1f} frames/s "
+          f"({frames / elapsed / fps:.1f}x real time) with {len(shards)} worker(s)")
+    print(f"✅ {len(events)} drowsiness events saved at: {output_path}")
+    print(f"✅ Per-frame data saved at: {frames_output}")
+    return events
@@ -0,0 +1,231 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from detection import MODEL_PATH, DrowsinessDetector
+from ear import compute_ear, landmarks_to_array
+from frame_context import FrameContext
+from metrics import time_calls
+from tracking import FaceTracker
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RESOLUTIONS = ["640x480", "1280x720", "1920x1080"]
+ITERATIONS = 100
+WARMUP = 10
+FRAMES_PER_SOURCE = 60
+REGRESSION_THRESHOLD = 0.15  # Fail when a warm p50 gets this much slower than the baseline
+NUM_LANDMARKS = 478
+
+
+def peak_rss_mb():
+    if resource is None:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 1e6
+        except (ImportError, AttributeError):
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3  # bytes on macOS, KB on Linux
+
+
+def load_frames(source, resolution, count=FRAMES_PER_SOURCE):
+    width, height = resolution
+    if source is None:
+        # Synthetic noise: exercises every stage, but FaceMesh takes its no-face path
+        rng = np.random.default_rng(0)
+        return [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+    cap = cv2.VideoCapture(source)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.resize(frame, (width, height)))
+    cap.release()
+    if not frames:
+        raise IOError(f"Could not read frames from {source}")
+    return frames
+
+
+def full_frame_landmarks(detector, rgb):
+    results = detector.face_mesh.process(rgb)
+    if not results.multi_face_landmarks:
+        return None
+    return landmarks_to_array(results.multi_face_landmarks[0], rgb.shape[1], rgb.shape[0])
+
+
+def tracked_landmarks(detector, rgb_frames):
+    # Same fallback as DrowsinessDetector.measure_eyes: crop while tracking, full frame to re-acquire
+    tracker = FaceTracker("crop")
+
+    def step(i):
+        rgb = rgb_frames[i % len(rgb_frames)]
+        landmarks = tracker.track(rgb)
+        if landmarks is None:
+            landmarks = full_frame_landmarks(detector, rgb)
+            tracker.start(landmarks, rgb.shape)
+        return landmarks
+    return step
+
+
+def tracking_ear_error(detector, rgb_frames):
+    # EAR from tracked crops vs full-frame FaceMesh on the same frames
+    track = tracked_landmarks(detector, rgb_frames)
+    errors = []
+    for i, rgb in enumerate(rgb_frames):
+        tracked = track(i)
+        full = full_frame_landmarks(detector, rgb)
+        if tracked is not None and full is not None:
+            errors.append(abs(compute_ear(tracked) - compute_ear(full)))
+    return {"ear_mean_abs_error": float(np.mean(errors)) if errors else None, "frames": len(errors)}
+
+
+def benchmark_model(model_path, sources, resolutions, iterations, warmup):
+    metrics = {}
+    start = time.perf_counter()
+    detector = DrowsinessDetector(model_path, audio=False)
+    model_name = f"{detector.backend.name}:{os.path.basename(model_path)}"
+    metrics[f"{model_name}/load"] = {"cold_ms": (time.perf_counter() - start) * 1000}
+
+    width, height = detector.input_size
+    batch = np.random.default_rng(0).random((1, height, width, 3), dtype=np.float32)
+    metrics[f"{model_name}/cnn"] = time_calls(lambda i: detector.backend.predict(batch), iterations, warmup)
+
+    ctx = FrameContext(detector.input_size)
+    for source in sources:
+        source_name = "synthetic" if source is None else os.path.basename(source)
+        for resolution in resolutions:
+            frames = load_frames(source, resolution)
+            prefix = f"{model_name}/{source_name}/{resolution[0]}x{resolution[1]}"
+
+            def next_frame(i):
+                ctx.frame = frames[i % len(frames)]
+                ctx.prepare(i, time.time())
+                return ctx
+
+            metrics[f"{prefix}/preprocess"] = time_calls(
+                lambda i: next_frame(i).fill_input(None), iterations, warmup)
+
+            rgb_frames = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+            metrics[f"{prefix}/facemesh"] = time_calls(
+                lambda i: detector.face_mesh.process(rgb_frames[i % len(rgb_frames)]), iterations, warmup)
+            if source is not None:
+                metrics[f"{prefix}/facemesh_tracked"] = time_calls(
+                    tracked_landmarks(detector, rgb_frames), iterations, warmup)
+                metrics[f"{prefix}/ear_tracking"] = tracking_ear_error(detector, rgb_frames)
+
+            def end_to_end(i):
+                next_frame(i)
+                detector.landmark_stage(ctx)
+                detector.cnn_stage(ctx)
+                detector.update_status(ctx, ctx.captured_at)
+
+            metrics[f"{prefix}/end_to_end"] = time_calls(end_to_end, iterations, warmup)
+
+    detector.close()
+    return metrics
+
+
+def run_benchmark(models, clips, resolutions, iterations=ITERATIONS, warmup=WARMUP):
+    sources = [None] + list(clips)
+    metrics = {}
+
+    # EAR is resolution and model independent: time it once on a landmark array
+    landmarks = np.random.default_rng(0).random((NUM_LANDMARKS, 3), dtype=np.float32) * 640
+    metrics["ear"] = time_calls(lambda i: compute_ear(landmarks), iterations, warmup)
+
+    for model_path in models:
+        metrics.update(benchmark_model(model_path, sources, resolutions, iterations, warmup))
+
+    return {
+        "meta": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "iterations": iterations,
+            "warmup": warmup,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "metrics": metrics,
+    }
+
+
+def compare_to_baseline(results, baseline, threshold=REGRESSION_THRESHOLD):
+    regressions = []
+    for key, current in results["metrics"].items():
+        previous = baseline["metrics"].get(key)
+        if not previous or "p50_ms" not in current or "p50_ms" not in previous:
+            continue
+        change = current["p50_ms"] / previous["p50_ms"] - 1 if previous["p50_ms"] else 0.0
+        marker = "❌" if change > threshold else "  "
+        print(f"{marker} {key:70} {previous['p50_ms']:9.2f} -> {current['p50_ms']:9.2f} ms ({change:+.1%})")
+        if change > threshold:
+            regressions.append(key)
+    return regressions
+
+
+def print_results(results):
+    print(f"{'Metric':70} {'Cold ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for key, m in results["metrics"].items():
+        if "p50_ms" in m:
+            print(f"{key:70} {m['cold_ms']:9.2f} {m['p50_ms']:9.2f} {m['p95_ms']:9.2f}")
+        elif "ear_mean_abs_error" in m:
+            error = m["ear_mean_abs_error"]
+            print(f"{key:70} EAR error {error:.4f} over {m['frames']} frames" if error is not None
+                  else f"{key:70} no face found")
+        else:
+            print(f"{key:70} {m['cold_ms']:9.2f}")
+    if results["peak_rss_mb"] is not None:
+        print(f"Peak RSS: {results['peak_rss_mb']:.0f} MB")
+
+
+def parse_resolution(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark detection latency and throughput without camera or display")
+    parser.add_argument("--models", nargs="+", default=[MODEL_PATH], help="Model files to benchmark (one per backend)")
+    parser.add_argument("--clips", nargs="*", default=[], help="Recorded clips to use in addition to synthetic frames")
+    parser.add_argument("--resolutions", nargs="+", default=RESOLUTIONS, help="Frame sizes, e.g. 640x480")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    parser.add_argument("--warmup", type=int, default=WARMUP)
+    parser.add_argument("--output", default="benchmark.json", help="Where to save the results")
+    parser.add_argument("--baseline", help="Stored results to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Allowed warm p50 slowdown before the run fails (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    resolutions = [parse_resolution(r) for r in args.resolutions]
+    results = run_benchmark(args.models, args.clips, resolutions, args.iterations, args.warmup)
+    print_results(results)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results saved at: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) over {args.threshold:.0%}")
+            sys.exit(1)
+        print("✅ No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
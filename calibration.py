@@ -0,0 +1,101 @@
+import json
+import math
+import os
+import time
+
+# Per-driver EAR thresholds: the open-eye EAR distribution is learned online during the first
+# minutes of driving, turned into thresholds, and stored so the next session starts calibrated.
+PROFILE_PATH = os.path.join(os.path.expanduser("~"), ".drowziguard", "drivers.json")
+CALIBRATION_SECONDS = 120.0  # Seconds of visible, alert face needed
+MIN_SAMPLES = 300
+WARMUP_SAMPLES = 30  # Samples before the running mean is trusted for outlier rejection
+MIN_OPEN_EAR = 0.15  # During warm-up, anything lower is a blink or a bad landmark fit
+OUTLIER_RATIO = 0.8  # Afterwards, samples below this fraction of the open-eye mean are blinks
+CLOSED_RATIO = 0.75  # Eyes count as closed below this fraction of the driver's open-eye EAR
+THRESHOLD_RANGE = (0.12, 0.35)
+MAX_SAMPLE_GAP = 1.0  # Seconds; longer gaps (paused, no face, new session) don't count as calibration time
+PROFILE_SETTINGS = ("blink_threshold", "ear_hysteresis", "blink_duration_threshold")
+
+
+class RunningStats:
+    # Welford's online mean / variance: one pass, constant memory, numerically stable
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def to_dict(self):
+        return {"count": self.count, "mean": self.mean, "m2": self.m2}
+
+
+def derive_thresholds(stats):
+    low, high = THRESHOLD_RANGE
+    threshold = min(max(stats.mean * CLOSED_RATIO, low), high)
+    # Reopen halfway back to the open-eye mean at most, so narrow-eyed drivers can still reopen
+    hysteresis = max(0.005, min(0.03, (stats.mean - threshold) / 2))
+    return {"blink_threshold": round(threshold, 4), "ear_hysteresis": round(hysteresis, 4)}
+
+
+class EarCalibrator:
+    def __init__(self, seconds=CALIBRATION_SECONDS, min_samples=MIN_SAMPLES):
+        self.seconds = seconds
+        self.min_samples = min_samples
+        self.stats = RunningStats()
+        self.rejected = 0
+        self.elapsed = 0.0
+        self._last_time = None
+
+    def add(self, ear, now):
+        # Feed one open-eye candidate; returns True once enough has been seen
+        if self._last_time is not None:
+            self.elapsed += min(max(now - self._last_time, 0.0), MAX_SAMPLE_GAP)
+        self._last_time = now
+        floor = MIN_OPEN_EAR if self.stats.count < WARMUP_SAMPLES else self.stats.mean * OUTLIER_RATIO
+        if ear < floor:
+            self.rejected += 1
+        else:
+            self.stats.add(ear)
+        return self.done
+
+    @property
+    def done(self):
+        return self.elapsed >= self.seconds and self.stats.count >= self.min_samples
+
+    @property
+    def progress(self):
+        return min(self.elapsed / self.seconds, self.stats.count / self.min_samples, 1.0)
+
+    def profile(self):
+        return {**derive_thresholds(self.stats), "ear": self.stats.to_dict(), "rejected": self.rejected,
+                "calibrated_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+class ProfileStore:
+    # Small JSON file keyed by driver ID, rewritten atomically on every save
+    def __init__(self, path=PROFILE_PATH):
+        self.path = path
+        self.profiles = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.profiles = json.load(f)["drivers"]
+
+    def get(self, driver_id):
+        return self.profiles.get(driver_id)
+
+    def save(self, driver_id, profile):
+        self.profiles[driver_id] = profile
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"drivers": self.profiles}, f, indent=2)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,161 @@
+import os
+import time
+from collections import deque
+
+import cv2
+
+# Capture settings are requested explicitly instead of taking the driver's defaults: many USB
+# webcams default to uncompressed YUYV, which caps them at a few FPS above 640x480, and to a
+# multi-frame buffer that makes every read a stale frame.
+CAMERA_SIZE = (640, 480)  # FaceMesh and the 224 px classifier input need no more than this
+CAMERA_FPS = 30
+CAMERA_FOURCC = "MJPG"  # Compressed on the camera: full frame rate over USB 2.0
+CAMERA_BUFFER = 1  # Frames queued in the driver; 1 = always the freshest frame
+STALL_SECONDS = 1.0  # No frame for this long counts as a camera stall
+FPS_WINDOW = 60  # Frames kept for the delivered-FPS figure
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def parse_source(source):
+    # "0" -> webcam index 0; anything else is a directory of images, a file path or a stream URL
+    if isinstance(source, str) and source.isdigit():
+        return int(source)
+    return source
+
+
+def parse_size(text):
+    # "640x480" -> (640, 480)
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+class ImageFolder:
+    # A directory of frames (sorted by name) behind the VideoCapture interface, for repeatable tests
+    def __init__(self, path, loop=False):
+        self.paths = sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.loop = loop
+        self.index = 0
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def read(self, image=None):
+        if self.index >= len(self.paths):
+            if not self.loop or not self.paths:
+                return False, image
+            self.index = 0
+        frame = cv2.imread(self.paths[self.index], cv2.IMREAD_COLOR)
+        self.index += 1
+        if frame is None:
+            return False, image
+        if image is not None and image.shape == frame.shape:
+            image[...] = frame  # Keep the caller's buffer, as VideoCapture.read(image) does
+            return True, image
+        return True, frame
+
+    def get(self, prop):
+        return 0.0
+
+    def release(self):
+        self.paths = []
+
+
+class Camera:
+    # Drop-in for cv2.VideoCapture (isOpened / read / release) that also applies capture
+    # settings, paces file sources, and tracks delivered FPS and stalls.
+    def __init__(self, source=0, size=CAMERA_SIZE, fps=CAMERA_FPS, fourcc=CAMERA_FOURCC,
+                 buffer_size=CAMERA_BUFFER, realtime=True, loop=False, stall_seconds=STALL_SECONDS):
+        self.source = parse_source(source)
+        self.live = isinstance(self.source, int) or "://" in str(self.source)
+        if isinstance(self.source, str) and os.path.isdir(self.source):
+            self.cap = ImageFolder(self.source, loop)
+            self.source_fps = fps
+        else:
+            self.cap = cv2.VideoCapture(self.source)
+            if isinstance(self.source, int):
+                self._configure(size, fps, fourcc, buffer_size)
+            self.source_fps = self.cap.get(cv2.CAP_PROP_FPS) or fps
+        # Recorded sources are played back at their own frame rate so the live pipeline sees
+        # what a camera would deliver; realtime=False reads them as fast as decoding allows
+        self.frame_interval = 1.0 / self.source_fps if realtime and not self.live else 0.0
+        self.stall_seconds = stall_seconds
+        self.ended = False
+        self.frames = 0
+        self.stalls = 0
+        self.stalled_seconds = 0.0
+        self.last_frame_at = None
+        self._delivered = deque(maxlen=FPS_WINDOW)
+        self._next_frame_at = None
+        if self.isOpened():
+            print(f"📷 Camera {self.source}: {self.describe()}")
+
+    def _configure(self, size, fps, fourcc, buffer_size):
+        # FOURCC first: some drivers only offer the higher resolutions/frame rates with MJPEG
+        if fourcc:
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        if size:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+        if fps:
+            self.cap.set(cv2.CAP_PROP_FPS, fps)
+        if buffer_size:
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+        # Drivers silently fall back to what they support; report what was actually granted
+        granted = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        if size and granted != tuple(size):
+            print(f"⚠️ Camera granted {granted[0]}x{granted[1]} instead of {size[0]}x{size[1]}")
+
+    def describe(self):
+        if isinstance(self.cap, ImageFolder):
+            return f"{len(self.cap.paths)} images at {self.source_fps:.0f} fps"
+        width, height = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        code = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+        fourcc = "".join(chr((code >> 8 * i) & 0xFF) for i in range(4)).strip("\x00") or "?"
+        return f"{width}x{height} @ {self.source_fps:.0f} fps ({fourcc})"
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def read(self, image=None):
+        if self.frame_interval:
+            now = time.perf_counter()
+            if self._next_frame_at is not None and now < self._next_frame_at:
+                time.sleep(self._next_frame_at - now)
+            self._next_frame_at = max(now, self._next_frame_at or now) + self.frame_interval
+        started = time.perf_counter()
+        ret, image = self.cap.read(image)
+        now = time.perf_counter()
+        if not ret:
+            self.ended = not self.live
+            return False, image
+
+        # Time blocked in read(), not time between reads: a slow caller isn't a camera stall
+        waited = now - started
+        if waited > self.stall_seconds:
+            self.stalls += 1
+            self.stalled_seconds += waited
+            print(f"⚠️ Camera stalled: no frame for {waited:.1f}s")
+        self.last_frame_at = now
+        self.frames += 1
+        self._delivered.append(now)
+        return True, image
+
+    @property
+    def stalled(self):
+        # For callers waiting on a capture thread: no frame for a while (meaningful when read() is called continuously)
+        return self.last_frame_at is not None and time.perf_counter() - self.last_frame_at > self.stall_seconds
+
+    @property
+    def delivered_fps(self):
+        if len(self._delivered) < 2:
+            return 0.0
+        elapsed = self._delivered[-1] - self._delivered[0]
+        return (len(self._delivered) - 1) / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f"📷 Camera: {self.frames} frames, {self.delivered_fps:.1f} fps delivered "
+                f"(source: {self.source_fps:.0f} fps), {self.stalls} stall(s) totalling {self.stalled_seconds:.1f}s")
+
+    def release(self):
+        self.cap.release()
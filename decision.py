@@ -0,0 +1,242 @@
+import math
+from collections import deque
+
+import numpy as np
+
+from multitask import drowsy_scores
+
+# Streaming drowsiness decisions: per-frame signals (EAR, mouth opening, class probabilities) are
+# smoothed and fed through hysteresis and time windows, so one noisy frame can neither raise nor
+# clear a verdict. Every update is O(1) (the median filter is over a fixed handful of frames).
+EAR_MEDIAN_FRAMES = 5  # Median filter length for EAR: removes single-frame landmark glitches
+EAR_HYSTERESIS = 0.03  # Eyes count as open again only this far above the closing threshold
+PROB_TAU = 0.6  # Seconds; time constant of the class-probability EMA (independent of CNN cadence)
+DROWSY_ON = 0.7  # Smoothed drowsy probability that raises the model verdict...
+DROWSY_OFF = 0.4  # ...and the one that clears it
+DROWSY_GAP = DROWSY_ON - DROWSY_OFF  # Kept between the two when the drowsy threshold is reconfigured
+PROB_STALE = 3.0  # Seconds without a CNN result (e.g. no face in ROI mode) before the model verdict lapses
+FACE_LOST_GRACE = 0.5  # Seconds without a face before eye-closure state is dropped
+PERCLOS_WINDOW = 60.0  # Seconds of eyelid-closure history
+PERCLOS_THRESHOLD = 0.15  # Fraction of time closed that counts as drowsy (P80 PERCLOS)
+PERCLOS_MIN_SPAN = 20.0  # Seconds of history needed before PERCLOS can raise a verdict
+BLINK_MAX_SECONDS = 0.5  # Closures shorter than this are blinks
+BLINK_WINDOW = 60.0
+MAR_OPEN = 0.6  # Mouth aspect ratio above which the mouth counts as wide open...
+MAR_CLOSE = 0.45  # ...and below which it is closed again
+YAWN_MIN_SECONDS = 1.0  # Wide-open mouth for at least this long is a yawn, not speech
+YAWN_WINDOW = 300.0
+
+
+class Ema:
+    # Exponential moving average with a time constant, so irregular sample spacing
+    # (skipped CNN runs, dropped frames) weighs samples by the time they cover
+    def __init__(self, tau):
+        self.tau = tau
+        self.value = None
+        self._last_time = None
+
+    def update(self, value, now):
+        if self.value is None:
+            self.value = np.array(value, dtype=np.float64)
+        else:
+            alpha = 1.0 - math.exp(-max(now - self._last_time, 0.0) / self.tau)
+            self.value += alpha * (np.asarray(value, dtype=np.float64) - self.value)
+        self._last_time = now
+        return self.value
+
+    def reset(self):
+        self.value = None
+        self._last_time = None
+
+
+class Hysteresis:
+    # Boolean that switches on above `on` and only switches off again below `off`
+    # (or the mirror image with below=True, for "eyes closed when EAR is low")
+    def __init__(self, on, off, below=False):
+        self.on = on
+        self.off = off
+        self.below = below
+        self.state = False
+
+    def update(self, value):
+        if value is None:
+            return self.state
+        if self.below:
+            value, on, off = -value, -self.on, -self.off
+        else:
+            on, off = self.on, self.off
+        if self.state and value < off:
+            self.state = False
+        elif not self.state and value > on:
+            self.state = True
+        return self.state
+
+    def reset(self):
+        self.state = False
+
+
+class TimeWindow:
+    # Values over the last `seconds`: push/evict amortized O(1) with a running sum
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self._items = deque()
+        self.total = 0.0
+
+    def push(self, now, value=1.0):
+        self._items.append((now, value))
+        self.total += value
+        self.evict(now)
+
+    def evict(self, now):
+        while self._items and self._items[0][0] < now - self.seconds:
+            self.total -= self._items.popleft()[1]
+
+    @property
+    def count(self):
+        return len(self._items)
+
+    @property
+    def span(self):
+        return self._items[-1][0] - self._items[0][0] if self._items else 0.0
+
+    def mean(self):
+        return self.total / len(self._items) if self._items else 0.0
+
+    def reset(self):
+        self._items.clear()
+        self.total = 0.0
+
+
+class DecisionEngine:
+    def __init__(self, ear_threshold=0.25, closed_seconds=3.5):
+        self.ear_threshold = ear_threshold
+        self.closed_seconds = closed_seconds
+        self.ear_hysteresis = EAR_HYSTERESIS
+        self.drowsy_on = DROWSY_ON
+        self.drowsy_off = DROWSY_OFF
+        self._ears = deque(maxlen=EAR_MEDIAN_FRAMES)
+        self._eyes = Hysteresis(ear_threshold, ear_threshold + EAR_HYSTERESIS, below=True)
+        self._probs = Ema(PROB_TAU)
+        self._model = Hysteresis(DROWSY_ON, DROWSY_OFF)
+        self._mouth = Hysteresis(MAR_OPEN, MAR_CLOSE)
+        self._perclos = TimeWindow(PERCLOS_WINDOW)
+        self._blinks = TimeWindow(BLINK_WINDOW)
+        self._yawns = TimeWindow(YAWN_WINDOW)
+        self.reset()
+
+    def reset(self):
+        for part in (self._eyes, self._probs, self._model, self._mouth, self._perclos, self._blinks, self._yawns):
+            part.reset()
+        self._ears.clear()
+        self.started_at = None
+        self.updated_at = None
+        self.probs_at = None
+        self.face_seen_at = None
+        self.closed_since = None
+        self.yawn_since = None
+        self.ear = None
+        self.probs = None
+        self.drowsy_prob = None
+        self.eyes_closed = False
+        self.eyes_closed_long = False
+        self.drowsy_by_model = False
+        self.perclos_drowsy = False
+        self.last_yawn_duration = 0.0
+
+    def update(self, now, ear=None, mar=None, probs=None):
+        # ear/mar are None without a face, probs is None when the CNN didn't run on this frame
+        if self.started_at is None:
+            self.started_at = now
+        self.updated_at = now
+        if probs is not None:
+            self.probs_at = now
+            self.probs = self._probs.update(probs, now)
+            self.drowsy_prob = float(drowsy_scores(self.probs))
+            self._model.on, self._model.off = self.drowsy_on, self.drowsy_off
+            self.drowsy_by_model = self._model.update(self.drowsy_prob)
+        elif self.probs_at is not None and now - self.probs_at > PROB_STALE:
+            self._probs.reset()
+            self._model.reset()
+            self.probs_at = self.probs = self.drowsy_prob = None
+            self.drowsy_by_model = False
+
+        if ear is None:
+            if self.face_seen_at is None or now - self.face_seen_at > FACE_LOST_GRACE:
+                self._ears.clear()
+                self._eyes.reset()
+                self._mouth.reset()
+                self.closed_since = None
+                self.yawn_since = None
+                self.ear = None
+                self.eyes_closed = self.eyes_closed_long = False
+            return self
+
+        self.face_seen_at = now
+        self._ears.append(ear)
+        self.ear = float(np.median(self._ears))
+        self._eyes.on = self.ear_threshold  # Picks up live reconfiguration / calibration
+        self._eyes.off = self.ear_threshold + self.ear_hysteresis
+        closed = self._eyes.update(self.ear)
+        if closed and not self.eyes_closed:
+            self.closed_since = now
+        elif not closed and self.eyes_closed:
+            if now - self.closed_since <= BLINK_MAX_SECONDS:
+                self._blinks.push(now)
+            self.closed_since = None
+        self.eyes_closed = closed
+        self.eyes_closed_long = closed and now - self.closed_since >= self.closed_seconds
+        self._perclos.push(now, float(closed))
+        self.perclos_drowsy = (self._perclos.span >= PERCLOS_MIN_SPAN
+                               and self._perclos.mean() >= PERCLOS_THRESHOLD)
+
+        if mar is not None:
+            mouth_open = self._mouth.state
+            if self._mouth.update(mar) and not mouth_open:
+                self.yawn_since = now
+            elif not self._mouth.state and mouth_open:
+                duration = now - self.yawn_since
+                if duration >= YAWN_MIN_SECONDS:
+                    self._yawns.push(now)
+                    self.last_yawn_duration = duration
+                self.yawn_since = None
+        return self
+
+    @property
+    def perclos(self):
+        return self._perclos.mean()
+
+    @property
+    def blinks_per_minute(self):
+        if self.started_at is None:
+            return 0.0
+        self._blinks.evict(self.updated_at)
+        elapsed = min(BLINK_WINDOW, self.updated_at - self.started_at)
+        return self._blinks.count * 60.0 / elapsed if elapsed >= 1.0 else 0.0
+
+    @property
+    def yawn_duration(self):
+        # Ongoing yawn so far, or 0 when the mouth isn't wide open
+        return self.updated_at - self.yawn_since if self.yawn_since is not None else 0.0
+
+    @property
+    def yawns(self):
+        # Yawns over the last YAWN_WINDOW seconds
+        if self.started_at is not None:
+            self._yawns.evict(self.updated_at)
+        return self._yawns.count
+
+    def status(self):
+        if self.drowsy_by_model:
+            return "Drowsy"
+        if self.eyes_closed_long:
+            return "Drowsy (Eyes Closed)"
+        if self.perclos_drowsy:
+            return "Drowsy (PERCLOS)"
+        return "Non-Drowsy"
+
+    def features(self):
+        return {
+            "ear": self.ear, "drowsy_prob": self.drowsy_prob, "perclos": self.perclos,
+            "blinks_per_min": self.blinks_per_minute, "yawn_duration": self.yawn_duration,
+            "yawns": self.yawns, "last_yawn_duration": self.last_yawn_duration,
+        }
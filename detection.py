@@ -1,24 +1,68 @@
+import argparse
 import cv2
 import numpy as np
-import tensorflow as tf
-import mediapipe as mp
-from scipy.spatial import distance as dist
-import pygame
 import threading
 import time
-import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from alerts import AlertEngine
+from calibration import PROFILE_SETTINGS, EarCalibrator, ProfileStore
+from camera import CAMERA_FPS, CAMERA_SIZE, Camera, parse_size
+from decision import DROWSY_GAP, DecisionEngine
+from ear import compute_ear, compute_mar, landmarks_to_array
+from inference import BACKENDS, load_backend
+from metrics import MetricsServer, Profiler
+from multitask import DEFAULT_HEAD_THRESHOLDS, HEADS, LEGACY_DROWSY_CLASSES, LEGACY_NUM_CLASSES, drowsy_scores, is_multitask
+from pipeline import FramePipeline
+from recorder import EVENTS_DIR, EventRecorder
+from roi import ROI_MODES, FaceROI
+from scheduler import InferenceScheduler
+from tracking import TRACK_MODES, FaceTracker
+
+# MediaPipe, pygame and TensorFlow are imported where they're first used, so importing this
+# module (dashboard, multi-stream server, benchmarks) stays cheap.
+PROCESS_START = time.perf_counter()
 
 # Constants
 MODEL_PATH = r"Models\model224.h5"
 LABELS = ["Non-Drowsy", "Drowsy"]
-MODEL_INPUT_SIZE = (224, 224)  # MobileNetV2 input size
+EYES_OPEN_MARGIN = 0.05  # EAR this far above the threshold lets face tracking reuse landmarks on a still head
+TUNABLE_SETTINGS = ("blink_threshold", "blink_duration_threshold", "ear_hysteresis", "warning_duration",
+                    "alert_cooldown")
 
 class DrowsinessDetector:
-    def __init__(self, model_path=MODEL_PATH):
-        self.model = tf.keras.models.load_model(model_path)
+    def __init__(self, model_path=MODEL_PATH, backend=None, roi_mode="frame", input_size=None,
+                 cnn_every=None, cnn_hz=None, audio=True, profiler=None, fast_start=False, display=True,
+                 track="off"):
+        # backend may be a name ("keras", "tflite", "onnx") or an already loaded backend shared between detectors
+        if hasattr(backend, "predict"):
+            self.backend = backend
+        else:
+            self.backend = load_backend(model_path, backend, prefer_fast=fast_start)
+        self.input_size = input_size or self.backend.input_size
         self.running = False
+        self.paused = False
+        # A session spans camera opening and warm-up too: `active` is claimed before either, so a
+        # stop arriving meanwhile isn't lost and a second start is refused
+        self.active = False
+        self._stop_requested = False
+        self._session_lock = threading.Lock()
+        self.display = display  # False: headless, no OpenCV window
+        self.mirror = True  # Mirror the displayed/previewed frame like a selfie view; analysis sees the raw frame
+        self.camera_options = {}  # camera.Camera settings used when run() opens the camera itself
+        self._display_frame = None
+        self.status = "Stopped"
+        self.on_telemetry = None  # Optional callback receiving a dict per rendered frame
+        self.preview = None  # Optional preview.PreviewPublisher (shared-memory frames for the dashboard)
+        self.recorder = None  # Optional recorder.EventRecorder (footage and trace around each alert)
+
+        # Classifier input: whole frame, or a stabilized crop around the FaceMesh landmarks
+        self.roi_mode = roi_mode
+        self.face_roi = FaceROI(roi_mode)
+        self.face_landmarks = None  # (N, 3) pixel landmarks of the last detected face
 
         # Initialize MediaPipe FaceMesh
+        import mediapipe as mp
         self.face_mesh = mp.solutions.face_mesh.FaceMesh(
             max_num_faces=1,
             refine_landmarks=True,
@@ -27,145 +71,536 @@ class DrowsinessDetector:
         )
         self.left_eye_indices = [33, 160, 158, 133, 153, 144]  # Left eye landmarks
         self.right_eye_indices = [362, 385, 387, 263, 373, 380]  # Right eye landmarks
-        self.closed_eyes_start_time = None
+        self.eye_indices = np.array([self.left_eye_indices, self.right_eye_indices])
+        # Optional: FaceMesh on a tracked, downscaled face crop, full frame only to (re)acquire
+        self.tracker = FaceTracker(track) if track != "off" else None
         self.blink_threshold = 0.25  # Adjusted for better sensitivity
         self.blink_duration_threshold = 3.5  # 3-4 seconds
         self.warning_start_time = None
         self.warning_duration = 5  # 5-second warning display
         self.alert_cooldown = 2  # Reduced to allow frequent alerts
         self.last_alert_time = 0
+        self.last_ear = None
+        self.last_mar = None
 
-        # Initialize pygame mixer
-        pygame.mixer.init()
-
-    def preprocess_frame(self, frame):
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        resized = cv2.resize(rgb, MODEL_INPUT_SIZE)
-        normalized = resized / 255.0
-        return np.expand_dims(normalized, axis=0)
-
-    def predict_status(self, frame):
-        processed_frame = self.preprocess_frame(frame)
-        prediction = self.model.predict(processed_frame, verbose=0)[0]
-        
-        if len(prediction) != 4:
-            print(f"❌ Model output shape mismatch! Expected 4, got {len(prediction)}")
-            return "Unknown"
-        
-        class_idx = np.argmax(prediction)
-        if class_idx in [0, 3]:
-            return LABELS[0]  # Non-Drowsy
-        elif class_idx in [1, 2]:
-            return LABELS[1]  # Drowsy
-        return "Unknown"
-
-    def calculate_EAR(self, eye_points):
-        A = dist.euclidean(eye_points[1], eye_points[5])
-        B = dist.euclidean(eye_points[2], eye_points[4])
-        C = dist.euclidean(eye_points[0], eye_points[3])
-        ear = (A + B) / (2.0 * C)
-        return ear
-
-    def detect_eye_closure(self, frame):
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.face_mesh.process(rgb_frame)
-        if not results.multi_face_landmarks:
-            self.closed_eyes_start_time = None
-            return False
-
-        for face_landmarks in results.multi_face_landmarks:
-            h, w, _ = frame.shape
-            left_eye = [
-                (face_landmarks.landmark[i].x * w, face_landmarks.landmark[i].y * h)
-                for i in self.left_eye_indices
-            ]
-            right_eye = [
-                (face_landmarks.landmark[i].x * w, face_landmarks.landmark[i].y * h)
-                for i in self.right_eye_indices
-            ]
-
-            left_ear = self.calculate_EAR(left_eye)
-            right_ear = self.calculate_EAR(right_eye)
-            ear = (left_ear + right_ear) / 2.0
+        # Smoothed, hysteretic verdicts from EAR, mouth opening and class probabilities
+        self.decision = DecisionEngine(self.blink_threshold, self.blink_duration_threshold)
+        self.ear_hysteresis = self.decision.ear_hysteresis
+        self.default_settings = {key: getattr(self, key) for key in PROFILE_SETTINGS}  # Used while calibrating
+        # Multi-task models: probability above which each head's verdict is on ("drowsy" drives the model verdict)
+        self.head_thresholds = dict(DEFAULT_HEAD_THRESHOLDS)
 
-            current_time = time.time()
-            if ear < self.blink_threshold:
-                if self.closed_eyes_start_time is None:
-                    self.closed_eyes_start_time = current_time
-                elif current_time - self.closed_eyes_start_time >= self.blink_duration_threshold:
-                    return True
+        # Per-driver thresholds (see set_driver); without a driver the defaults above apply
+        self.driver_id = None
+        self.profiles = None
+        self.calibrator = None
+
+        # Adaptive CNN cadence; without it the CNN runs on every frame
+        self.cnn_every = cnn_every
+        self.cnn_hz = cnn_hz
+        self.scheduler = None
+        if cnn_every or cnn_hz:
+            self.scheduler = InferenceScheduler(cnn_every or 1, cnn_hz, self.blink_threshold)
+
+        # Optional per-stage timing (metrics.Profiler); None means no timing overhead at all
+        self.profiler = profiler
+
+        # Startup: warm-up inference runs in the background while the camera opens
+        self.warmed_up = False
+        self._warmup_thread = None
+        self.time_to_first_verdict = None
+
+        # Alert sound, decoded once and played on a reserved mixer channel
+        self.audio = audio
+        self.alerts = AlertEngine(profiler=profiler) if audio else None
+
+    def _timed(self, stage, fn, *args):
+        if self.profiler is None:
+            return fn(*args)
+        return self.profiler.call(stage, fn, *args)
+
+    def warmup(self):
+        # First calls pay for graph tracing / tensor allocation; do that before any real frame
+        if self.warmed_up:
+            return
+        width, height = self.input_size
+        self.backend.predict(np.zeros((1, height, width, 3), dtype=np.float32))
+        self.face_mesh.process(np.zeros((height, width, 3), dtype=np.uint8))
+        self.warmed_up = True
+
+    def start_warmup(self):
+        if not self.warmed_up and self._warmup_thread is None:
+            self._warmup_thread = threading.Thread(target=self.warmup, daemon=True)
+            self._warmup_thread.start()
+
+    def wait_warmup(self):
+        if self._warmup_thread is not None:
+            self._warmup_thread.join()
+            self._warmup_thread = None
+        self.warmup()
+
+    def reset_state(self):
+        # Per-session state, cleared when a resident detector is started again
+        self.warning_start_time = None
+        self.last_alert_time = 0
+        self.last_ear = None
+        self.last_mar = None
+        self.decision.reset()
+        if self.tracker:
+            self.tracker.reset()
+        self.face_landmarks = None
+        self.face_roi.reset()
+
+    def configure(self, **options):
+        # Live reconfiguration between or during sessions; the model is never reloaded
+        for key, value in options.items():
+            if key == "roi_mode":
+                self.roi_mode = value
+                self.face_roi = FaceROI(value)
+            elif key in ("cnn_every", "cnn_hz"):
+                setattr(self, key, value)
+                self.scheduler = None
+                if self.cnn_every or self.cnn_hz:
+                    self.scheduler = InferenceScheduler(self.cnn_every or 1, self.cnn_hz, self.blink_threshold)
+            elif key == "audio":
+                self.audio = value
+                if value and self.alerts is None:
+                    self.alerts = AlertEngine(profiler=self.profiler)
+            elif key == "head_thresholds":
+                unknown = set(value) - set(HEADS)
+                if unknown:
+                    raise ValueError(f"Unknown head(s) {', '.join(sorted(unknown))}. Choose from: {', '.join(HEADS)}")
+                self.head_thresholds.update({head: float(threshold) for head, threshold in value.items()})
+                self.decision.drowsy_on = self.head_thresholds["drowsy"]
+                self.decision.drowsy_off = max(0.0, self.head_thresholds["drowsy"] - DROWSY_GAP)
+            elif key in TUNABLE_SETTINGS:
+                setattr(self, key, value)
+                if key == "blink_threshold":
+                    self.decision.ear_threshold = value
+                    if self.scheduler:
+                        self.scheduler.ear_threshold = value
+                elif key == "blink_duration_threshold":
+                    self.decision.closed_seconds = value
+                elif key == "ear_hysteresis":
+                    self.decision.ear_hysteresis = value
             else:
-                self.closed_eyes_start_time = None
-            return False
+                raise ValueError(f"Unknown setting '{key}'")
+
+    def set_driver(self, driver_id, recalibrate=False, store=None):
+        # Loads the driver's stored thresholds, or calibrates them online during the next minutes
+        self.driver_id = driver_id
+        self.profiles = store or self.profiles or ProfileStore()
+        profile = None if recalibrate else self.profiles.get(driver_id)
+        if profile:
+            self.calibrator = None
+            self.configure(**{key: profile[key] for key in PROFILE_SETTINGS if key in profile})
+            print(f"👤 Driver {driver_id}: EAR threshold {self.blink_threshold:.3f} from profile")
+        else:
+            # The previous driver's thresholds don't apply to this one while calibration runs
+            self.configure(**self.default_settings)
+            self.calibrator = EarCalibrator()
+            print(f"👤 Driver {driver_id}: calibrating EAR thresholds...")
 
-    def play_alert(self):
+    def save_profile(self, profile=None):
+        if self.driver_id is None or self.calibrator is not None:
+            return  # Nothing calibrated yet
+        profile = dict(profile or self.profiles.get(self.driver_id) or {})
+        profile.update({key: getattr(self, key) for key in PROFILE_SETTINGS})
+        self.profiles.save(self.driver_id, profile)
+
+    def _calibrate(self, ear, current_time):
+        if not self.calibrator.add(ear, current_time):
+            return
+        profile = self.calibrator.profile()
+        self.calibrator = None
+        self.configure(**{key: profile[key] for key in PROFILE_SETTINGS if key in profile})
+        self.save_profile(profile)
+        ear_stats = profile["ear"]
+        print(f"✅ Driver {self.driver_id} calibrated: open-eye EAR {ear_stats['mean']:.3f}, "
+              f"threshold {self.blink_threshold:.3f}, saved at {self.profiles.path}")
+
+    def interpret_prediction(self, prediction):
+        if is_multitask(prediction):
+            return LABELS[1] if drowsy_scores(prediction) > self.head_thresholds["drowsy"] else LABELS[0]
+        if len(prediction) != LEGACY_NUM_CLASSES:
+            print(f"❌ Model output shape mismatch! Expected {LEGACY_NUM_CLASSES} classes or {len(HEADS)} heads, "
+                  f"got {len(prediction)}")
+            return "Unknown"
+        return LABELS[1] if np.argmax(prediction) in LEGACY_DROWSY_CLASSES else LABELS[0]
+
+    def head_verdicts(self):
+        # Per-head verdicts from the smoothed multi-task output (empty for the 4-class model)
+        probs = self.decision.probs
+        if probs is None or not is_multitask(probs):
+            return {}
+        return {head: bool(p > self.head_thresholds[head]) for head, p in zip(HEADS, probs)}
+
+    def measure_eyes(self, frame, rgb_frame=None):
+        # Landmarks, EAR and mouth aspect ratio of the face; returns the EAR, or None without a face
+        if rgb_frame is None:
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        landmarks = None
+        if self.tracker:
+            eyes_open = self.last_ear is not None and self.last_ear > self.blink_threshold + EYES_OPEN_MARGIN
+            landmarks = self._timed("facemesh_track", self.tracker.track, rgb_frame, eyes_open)
+        if landmarks is None:
+            results = self._timed("facemesh", self.face_mesh.process, rgb_frame)
+            if results.multi_face_landmarks:
+                # max_num_faces=1, so only the first face matters
+                h, w = frame.shape[:2]
+                landmarks = landmarks_to_array(results.multi_face_landmarks[0], w, h)
+            if self.tracker:
+                self.tracker.start(landmarks, frame.shape)
+
+        self.face_landmarks = landmarks
+        if landmarks is None:
+            self.last_ear = None
+            self.last_mar = None
+            return None
+        self.last_ear = compute_ear(self.face_landmarks, self.eye_indices)
+        self.last_mar = compute_mar(self.face_landmarks)
+        return self.last_ear
+
+    def play_alert(self, captured_at=None):
+        # Non-blocking: starts the preloaded sound and returns
         try:
-            print("Playing alert sound...")
-            pygame.mixer.music.load("Assets/alert2.mp3")
-            pygame.mixer.music.play()
-            while pygame.mixer.music.get_busy():
-                time.sleep(0.1)
+            self.alerts.trigger(captured_at)
         except Exception as e:
             print(f"Error playing alert: {e}")
 
-    def display_frame(self, frame, status, warning=None):
+    def display_frame(self, frame, status, warning=None, stats=None):
+        # The mirror flip happens here, on the display copy only, never on the frame being analysed
+        if self.mirror:
+            frame = self._display_frame = cv2.flip(frame, 1, dst=self._display_frame)
+        self.annotate_frame(frame, status, warning, stats)
+        cv2.imshow("Drowsiness Detection", frame)
+
+    def _annotate_preview(self, image, status, warning, stats):
+        if self.mirror:
+            cv2.flip(image, 1, dst=image)
+        return self.annotate_frame(image, status, warning, stats)
+
+    def annotate_frame(self, frame, status, warning=None, stats=None):
         color = (0, 255, 0) if "Non-Drowsy" in status else (0, 0, 255)
         cv2.putText(frame, f"Status: {status}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
         if warning:
             cv2.rectangle(frame, (0, 50), (frame.shape[1], 100), (0, 0, 255), -1)  # Red background for visibility
             cv2.putText(frame, warning, (10, 80), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-        cv2.imshow("Drowsiness Detection", frame)
+        if stats:
+            cv2.putText(frame, stats, (10, frame.shape[0] - 15), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
+        return frame
+
+    # Pipeline stages: each runs on its own thread and annotates the frame context
+    def landmark_stage(self, ctx):
+        if self.paused:
+            return
+        ctx.ear = self.measure_eyes(ctx.frame, ctx.get_rgb())
+        ctx.mar = self.last_mar
+        ctx.face_box = self.face_roi.update(self.face_landmarks, ctx.frame.shape)
+
+    def cnn_stage(self, ctx, predict=None):
+        # predict lets a caller route the input elsewhere (e.g. the multi-stream micro-batcher)
+        if self.paused or ctx.face_box is None:
+            return  # No face in ROI mode: nothing worth classifying
+        if self.scheduler and not self.scheduler.should_run(ctx.ear, ctx.captured_at):
+            ctx.drowsy_by_model = self.scheduler.last_drowsy  # Hold the last verdict
+            return
+        box = None if self.roi_mode == "frame" else ctx.face_box
+        input_tensor = self._timed("preprocess", ctx.fill_input, box)
+        if predict:
+            ctx.probs = self._timed("cnn", predict, input_tensor)
+        else:
+            ctx.probs = self._timed("cnn", self.backend.predict, input_tensor)[0]
+        ctx.drowsy_by_model = self.interpret_prediction(ctx.probs) == "Drowsy"
+        if self.scheduler:
+            self.scheduler.record(ctx.drowsy_by_model, ctx.captured_at)
+
+    def update_status(self, ctx, current_time=None):
+        # Returns (status, warning message, whether a new alert fired)
+        if self.paused:
+            return "Paused", None, False
+        if current_time is None:
+            current_time = time.time()
+        # Frames must arrive in capture order: the decision engine keeps per-stream history
+        decision = self.decision.update(current_time, ctx.ear, ctx.mar, ctx.probs)
+        ctx.drowsy_by_model = decision.drowsy_by_model
+        ctx.eyes_closed_long = decision.eyes_closed_long
+
+        status = decision.status()
+        if self.calibrator and ctx.ear is not None and status == "Non-Drowsy":
+            self._calibrate(ctx.ear, current_time)
+        warning_msg = None
+        alert = False
+        if status != "Non-Drowsy":
+            if current_time - self.last_alert_time > self.alert_cooldown:
+                warning_msg = "⚠️ Drowsiness Detected! Stay Alert for 5s"
+                self.warning_start_time = current_time
+                self.last_alert_time = current_time
+                alert = True
+            elif self.warning_start_time and (current_time - self.warning_start_time <= self.warning_duration):
+                warning_msg = "⚠️ Drowsiness Detected! Stay Alert for 5s"
+        return status, warning_msg, alert
 
-    def run(self):
-        cap = cv2.VideoCapture(0)
+    def render_stage(self, ctx, stats_text=None):
+        status, warning_msg, alert = self.update_status(ctx)
+        self.status = status
+        if alert and self.audio:
+            self.play_alert(ctx.captured_at)
+        if self.recorder:
+            # Before any overlay is drawn on the frame
+            self.recorder.add(ctx, status)
+            if alert:
+                self.recorder.trigger(status, ctx.captured_at)
+        if self.preview and self.preview.due():
+            # Downscale into shared memory first, then draw on the small copy; readers never block this
+            self._timed("preview", self.preview.publish, ctx.frame,
+                        lambda image: self._annotate_preview(image, status, warning_msg, stats_text))
+        if self.display:
+            self.display_frame(ctx.frame, status, warning_msg, stats_text)
+
+    def begin_session(self):
+        # Claims the detector for one session; False while another one is starting or running
+        with self._session_lock:
+            if self.active:
+                return False
+            self.active = True
+            self._stop_requested = False
+            return True
+
+    def run(self, cap=None):
+        # Can be called again after stop(): the model and FaceMesh stay loaded between sessions.
+        # Callers that must refuse concurrent starts (the service) claim the session beforehand.
+        if not self.active and not self.begin_session():
+            print("⚠️ A detection session is already running.")
+            return
+        try:
+            self._run_session(cap)
+        finally:
+            with self._session_lock:
+                self.active = False
+                self.running = False
+
+    def _run_session(self, cap):
+        run_started = time.perf_counter()
+        first_run = self.time_to_first_verdict is None
+        self.reset_state()
+        self.start_warmup()
+        if self._stop_requested:
+            self.status = "Stopped"
+            return
+        if cap is None:
+            cap = open_camera(**self.camera_options)
         if not cap.isOpened():
             print("Error: Could not open webcam.")
+            self.status = "Camera Error"
             return
+        self.wait_warmup()
+        if self.profiler and self.profiler.trace:
+            self.profiler.trace.start()  # The trace window covers frames, not model loading
+        with self._session_lock:
+            if self._stop_requested:
+                # Stopped while the camera opened or the model warmed up
+                print("⏹️ Session stopped before the first frame.")
+                cap.release()
+                self.status = "Stopped"
+                return
+            self.running = True
 
-        self.running = True
-        while self.running:
-            ret, frame = cap.read()
+        def read_frame(ctx):
+            # Read into the context's own buffer instead of allocating a new frame; analysis
+            # uses it as captured (mirroring is for display only)
+            ret, ctx.raw = cap.read(ctx.raw)
             if not ret:
-                print("Error: Could not read frame.")
-                break
+                return False
+            ctx.frame = ctx.raw
+            return True
 
-            frame = cv2.flip(frame, 1)
-            current_time = time.time()
+        if self.profiler:
+            read_frame = self.profiler.wrap("capture", read_frame)
+        pipeline = FramePipeline(read_frame, [self.landmark_stage, self.cnn_stage], self.input_size)
+        pipeline.start()
+
+        while self.running:
+            ctx = pipeline.get(timeout=1.0)
+            if ctx is None:
+                if not pipeline.alive:
+                    if getattr(cap, "ended", False):
+                        print("📼 End of input.")
+                    else:
+                        print(f"Error: {pipeline.error or 'Pipeline stopped.'}")
+                    break
+                if getattr(cap, "stalled", False):
+                    self.status = "Camera Stalled"
+                continue
 
-            # Model-based drowsiness detection
-            drowsy_by_model = self.predict_status(frame) == "Drowsy"
-            # Eye closure detection
-            eyes_closed_long = self.detect_eye_closure(frame)
-
-            status = "Non-Drowsy"
-            warning_msg = None
-            if drowsy_by_model or eyes_closed_long:
-                status = "Drowsy" if drowsy_by_model else "Drowsy (Eyes Closed)"
-                if current_time - self.last_alert_time > self.alert_cooldown:
-                    warning_msg = "⚠️ Drowsiness Detected! Stay Alert for 5s"
-                    self.warning_start_time = current_time
-                    self.last_alert_time = current_time
-                    threading.Thread(target=self.play_alert, daemon=True).start()
-                elif self.warning_start_time and (current_time - self.warning_start_time <= self.warning_duration):
-                    warning_msg = "⚠️ Drowsiness Detected! Stay Alert for 5s"
-
-            self.display_frame(frame, status, warning_msg)
-
-            if cv2.waitKey(1) & 0xFF == ord("q"):
+            pipeline.stats.record(ctx)
+            if pipeline.stats.frames_processed == 1:
+                self._record_first_verdict(run_started, first_run)
+            stats_text = f"FPS: {pipeline.stats.fps:.1f} | Latency: {ctx.latency * 1000:.0f} ms | Dropped: {pipeline.dropped}"
+            if self.scheduler:
+                stats_text += f" | CNN: {self.scheduler.duty_cycle:.0%}"
+            stats_text += f" | PERCLOS: {self.decision.perclos:.0%} | Blinks/min: {self.decision.blinks_per_minute:.0f}"
+            self._timed("display", self.render_stage, ctx, stats_text)
+            if self.on_telemetry:
+                self.on_telemetry({
+                    "time": time.time(), "frame": ctx.frame_id, "status": self.status, "ear": ctx.ear,
+                    "fps": pipeline.stats.fps, "latency_ms": ctx.latency * 1000, "dropped": pipeline.dropped,
+                    "cnn_duty_cycle": self.scheduler.duty_cycle if self.scheduler else 1.0,
+                    "camera_fps": getattr(cap, "delivered_fps", None),
+                    "driver": self.driver_id, "calibration": self.calibrator.progress if self.calibrator else None,
+                    "heads": self.head_verdicts(), **self.decision.features(),
+                })
+            pipeline.release(ctx)
+            pipeline.stats.maybe_print(pipeline.dropped)
+            if self.profiler:
+                self.profiler.add("end_to_end", ctx.latency)
+                self.profiler.frame()
+                self.profiler.set_gauge("frames_dropped_total", pipeline.dropped)
+                if self.scheduler:
+                    self.profiler.set_gauge("cnn_duty_cycle", round(self.scheduler.duty_cycle, 4))
+                if isinstance(cap, Camera):
+                    self.profiler.set_gauge("camera_fps", round(cap.delivered_fps, 2))
+                    self.profiler.set_gauge("camera_stalls_total", cap.stalls)
+
+            if self.display and self._timed("waitkey", cv2.waitKey, 1) & 0xFF == ord("q"):
                 break
 
         self.running = False
+        self.status = "Stopped"
+        pipeline.stop()
+        print(pipeline.stats.summary(pipeline.dropped))
+        if isinstance(cap, Camera):
+            print(cap.summary())
+        if self.scheduler:
+            print(self.scheduler.summary())
+        if self.tracker:
+            print(self.tracker.summary())
+        if self.recorder:
+            print(self.recorder.summary())
+        if self.alerts:
+            self.alerts.stop()
+            print(self.alerts.summary())
+        if self.profiler:
+            print(self.profiler.summary())
+            if self.profiler.trace:
+                self.profiler.trace.dump()
         cap.release()
-        cv2.destroyAllWindows()
-        self.face_mesh.close()
-        pygame.mixer.quit()
+        if self.display:
+            cv2.destroyAllWindows()
+
+    def _record_first_verdict(self, run_started, first_run):
+        now = time.perf_counter()
+        self.time_to_first_verdict = now - run_started
+        message = f"🚀 Time to first verdict: {self.time_to_first_verdict:.2f}s"
+        if first_run:
+            message += f" ({now - PROCESS_START:.2f}s since process start)"
+        print(message)
+        if self.profiler:
+            self.profiler.set_gauge("time_to_first_verdict_seconds", round(self.time_to_first_verdict, 4))
 
     def stop(self):
-        self.running = False
+        with self._session_lock:
+            self._stop_requested = True
+            self.running = False
 
-def detection():
-    detector = DrowsinessDetector()
-    detector.run()
+    def close(self):
+        self.face_mesh.close()
+        if self.tracker:
+            self.tracker.close()
+        if self.preview:
+            self.preview.close()
+        if self.recorder:
+            self.recorder.close()  # Finishes the event in progress and waits for pending writes
+        if self.alerts:
+            self.alerts.close()
+            self.alerts = None
+
+def open_camera(source=0, size=CAMERA_SIZE, fps=CAMERA_FPS, **options):
+    # Webcam index, video file, stream URL or directory of images; see camera.Camera
+    return Camera(source, size, fps, **options)
+
+def detection(model_path=MODEL_PATH, backend=None, roi_mode="frame", input_size=None, cnn_every=None, cnn_hz=None,
+              metrics_port=None, profile_seconds=None, trace_output="trace.json", fast_start=False, driver_id=None,
+              recalibrate=False, track="off", record_dir=None, head_thresholds=None, camera_options=None):
+    profiler = None
+    metrics_server = None
+    if metrics_port or profile_seconds:
+        profiler = Profiler(trace_output if profile_seconds else None, profile_seconds)
+    if metrics_port:
+        metrics_server = MetricsServer(profiler, metrics_port)
+        metrics_server.start()
+
+    # Open the camera while the model loads, then warm up while the camera settles
+    with ThreadPoolExecutor(1) as pool:
+        camera = pool.submit(open_camera, **(camera_options or {}))
+        detector = DrowsinessDetector(model_path, backend, roi_mode, input_size, cnn_every, cnn_hz,
+                                      profiler=profiler, fast_start=fast_start, track=track)
+        detector.start_warmup()
+        if head_thresholds:
+            detector.configure(head_thresholds=head_thresholds)
+        if driver_id:
+            detector.set_driver(driver_id, recalibrate)
+        if record_dir:
+            detector.recorder = EventRecorder(record_dir, num_outputs=detector.backend.output_size)
+        cap = camera.result()
+    try:
+        detector.run(cap)
+    finally:
+        detector.close()
+        if metrics_server:
+            metrics_server.stop()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Real-time driver drowsiness detection")
+    parser.add_argument("--model", default=MODEL_PATH, help="Model file (.h5, .tflite or .onnx)")
+    parser.add_argument("--backend", choices=BACKENDS, help="Inference backend (default: inferred from the model file)")
+    parser.add_argument("--roi", choices=ROI_MODES, default="frame",
+                        help="Classify the whole frame or a landmark-derived face / eyes+mouth crop")
+    parser.add_argument("--input-size", type=int,
+                        help="Square classifier input size, e.g. 160 (needs a TFLite model or one trained at that size)")
+    parser.add_argument("--track", choices=TRACK_MODES, default="off",
+                        help="Run FaceMesh on a tracked, downscaled face crop; 'skip' also reuses landmarks on a still head")
+    parser.add_argument("--cnn-every", type=int,
+                        help="Adaptive scheduling: run the CNN every N frames, escalating to every frame on EAR/face cues")
+    parser.add_argument("--cnn-hz", type=float, help="Adaptive scheduling with a base cadence in Hz instead of frames")
+    parser.add_argument("--camera", default="0",
+                        help="Webcam index, video file, stream URL or directory of images (files play at their own FPS)")
+    parser.add_argument("--camera-size", type=parse_size, default=CAMERA_SIZE, metavar="WxH",
+                        help="Capture resolution requested from the webcam (default: %(default)s)")
+    parser.add_argument("--camera-fps", type=float, default=CAMERA_FPS, help="Capture frame rate requested from the webcam")
+    parser.add_argument("--metrics-port", type=int, help="Serve per-stage timings in Prometheus format on this port")
+    parser.add_argument("--profile", type=float, metavar="SECONDS",
+                        help="Time every stage and write a Chrome trace of the first SECONDS")
+    parser.add_argument("--trace-output", default="trace.json", help="Chrome trace file for --profile")
+    parser.add_argument("--fast-start", action="store_true",
+                        help="Load the sibling .tflite of a Keras model if it's up to date (see inference.py export)")
+    parser.add_argument("--driver", help="Driver ID: load their calibrated EAR thresholds, or calibrate and save them")
+    parser.add_argument("--recalibrate", action="store_true", help="Ignore the stored profile for --driver")
+    parser.add_argument("--head-threshold", action="append", default=[], metavar="HEAD=P",
+                        help=f"Multi-task model: verdict threshold for one head ({', '.join(HEADS)}), repeatable")
+    parser.add_argument("--record", nargs="?", const=EVENTS_DIR, metavar="DIR",
+                        help=f"Save footage and EAR/probability traces around each alert (default dir: {EVENTS_DIR})")
+
+    # Offline analysis of recorded footage (headless, as fast as decoding allows)
+    parser.add_argument("--input", help="Analyze a recorded video instead of the webcam")
+    parser.add_argument("--output", default="events.jsonl", help="Drowsiness events (JSON lines) for --input")
+    parser.add_argument("--frames-output", help="Per-frame EAR / probabilities (.npz or .parquet) for --input")
+    parser.add_argument("--workers", type=int, help="Processes to shard the video across (default: CPU count)")
+    parser.add_argument("--start", type=float, default=0.0, help="Start of the analyzed range, in seconds")
+    parser.add_argument("--end", type=float, help="End of the analyzed range, in seconds")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    detection()
\ No newline at end of file
+    args = parse_args()
+    input_size = (args.input_size, args.input_size) if args.input_size else None
+    head_thresholds = {head: float(p) for head, p in (item.split("=", 1) for item in args.head_threshold)}
+    if args.input:
+        from batch_analysis import run_batch_analysis
+
+        run_batch_analysis(args.input, args.output, args.frames_output, args.model, args.backend, args.roi,
+                           args.workers, args.start, args.end)
+    else:
+        detection(args.model, args.backend, args.roi, input_size, args.cnn_every, args.cnn_hz,
+                  args.metrics_port, args.profile, args.trace_output, args.fast_start, args.driver, args.recalibrate,
+                  args.track, args.record, head_thresholds,
+                  {"source": args.camera, "size": args.camera_size, "fps": args.camera_fps})
@@ -0,0 +1,349 @@
+import argparse
+import itertools
+import json
+import os
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.applications import MobileNetV2
+from tensorflow.keras.callbacks import EarlyStopping
+from tensorflow.keras.layers import Activation, BatchNormalization, Conv2D, Dense, Dropout, GlobalAveragePooling2D, ReLU
+from tensorflow.keras.models import Model
+from tensorflow.keras.optimizers import Adam
+
+from inference import TFLiteBackend, export_tflite
+from metrics import time_calls
+from model import (DATASET_PATH, IMG_HEIGHT, IMG_WIDTH, YAWN_DATASET_PATH, ThroughputCallback, build_datasets,
+                   build_multitask_datasets, masked_binary_crossentropy)
+from multitask import HEADS
+
+# Distills the full 224 px MobileNetV2 (the teacher, from model.py) into narrow, low-resolution
+# students, prunes whole channels from them, and reports accuracy / latency / size for each so
+# the student that fits the per-frame budget of the target CPU can be picked.
+TEACHER_PATH = "drowsiness_model_4class.h5"
+OUTPUT_DIR = "students"
+ALPHAS = [0.35, 0.5]  # MobileNetV2 width multipliers
+SIZES = [96, 112]  # Student input resolutions
+KEEP_RATIOS = [1.0, 0.5, 0.25]  # Fraction of pruned channels/units kept by structured pruning
+PRUNED_BLOCKS = range(10, 17)  # MobileNetV2 blocks whose expanded channels are pruned: the widest ones
+LAST_FILTERS = 1280  # MobileNetV2's final 1x1 conv keeps 1280 channels at every alpha <= 1.0
+STUDENT_HIDDEN = 64
+TEMPERATURE = 4.0  # Softens the teacher's outputs so the student learns the relative class scores
+HARD_WEIGHT = 0.3  # Weight of the ground-truth loss; the rest goes to matching the teacher
+EPOCHS = 15
+FINE_TUNE_EPOCHS = 3  # Distillation epochs after each pruning step
+LEARNING_RATE = 5e-4
+LATENCY_THREADS = 1  # In-cab units have a core or two to spare for the classifier
+LATENCY_RUNS = 200
+BUDGET_MS = 10.0  # Per-frame classifier budget used for the recommendation
+EPSILON = 1e-6
+
+
+def to_logits(probs, multitask):
+    # The teacher ends in softmax/sigmoid; its logits are recovered (up to a constant) from the probabilities
+    probs = tf.clip_by_value(probs, EPSILON, 1.0 - EPSILON)
+    if multitask:
+        return tf.math.log(probs) - tf.math.log(1.0 - probs)
+    return tf.math.log(probs)
+
+
+def build_head(backbone, num_outputs, multitask, filters=LAST_FILTERS, hidden=STUDENT_HIDDEN, name=None):
+    # Final 1x1 conv + classifier on top of a backbone (inputs, features) pair. Separate "logits" and
+    # "probs" layers: distillation trains on logits, the saved model outputs probabilities like model.py's.
+    inputs, features = backbone
+    x = Conv2D(filters, 1, use_bias=False, name="head_conv")(features)
+    x = BatchNormalization(epsilon=1e-3, momentum=0.999, name="head_bn")(x)
+    x = ReLU(6.0, name="head_relu")(x)
+    x = GlobalAveragePooling2D()(x)
+    x = Dense(hidden, activation="relu", name="hidden")(x)
+    x = Dropout(0.5)(x)
+    logits = Dense(num_outputs, name="logits")(x)
+    outputs = Activation("sigmoid" if multitask else "softmax", name="probs")(logits)
+    return Model(inputs, outputs, name=name)
+
+
+def build_student(alpha, size, num_outputs, multitask):
+    base = MobileNetV2(alpha=alpha, include_top=False, weights="imagenet", input_shape=(size, size, 3))
+    backbone = (base.input, base.get_layer("block_16_project_BN").output)
+    student = build_head(backbone, num_outputs, multitask, name=f"student_{int(alpha * 100)}_{size}")
+    # Start the head conv from ImageNet too (same shape as the backbone's own Conv_1)
+    student.get_layer("head_conv").set_weights(base.get_layer("Conv_1").get_weights())
+    student.get_layer("head_bn").set_weights(base.get_layer("Conv_1_bn").get_weights())
+    return student
+
+
+def _strongest(scores, keep):
+    # Indices of the highest-scoring fraction `keep` of channels, in their original order
+    return np.sort(np.argsort(scores)[-max(1, round(len(scores) * keep)):])
+
+
+def _block_part(name):
+    # "block_13_expand_BN" -> ("block_13", "expand_BN"); layers outside the inverted-residual blocks -> (None, None)
+    parts = name.split("_", 2)
+    if len(parts) == 3 and parts[0] == "block" and parts[1].isdigit():
+        return f"block_{parts[1]}", parts[2]
+    return None, None
+
+
+def prune_student(student, keep, multitask):
+    # Structured pruning: whole channels are removed, ranked by weight norm, so the result is a smaller
+    # dense model (faster on any runtime), not sparse weights. In the backbone, the expanded channels
+    # of the later inverted-residual blocks (each block keeps its input and output width, so residual
+    # connections are untouched); in the head, final-conv channels and hidden units.
+    weights = {layer.name: layer.get_weights() for layer in student.layers}
+    blocks = {}
+    for block in PRUNED_BLOCKS:
+        name = f"block_{block}"
+        if f"{name}_expand" in weights:
+            # A channel's contribution: its BatchNorm gain times the projection weights reading it
+            project, = weights[f"{name}_project"]
+            blocks[name] = _strongest(np.abs(project).sum(axis=(0, 1, 3)) * np.abs(weights[f"{name}_depthwise_BN"][0]),
+                                      keep)
+    kernel, = weights["head_conv"]
+    bn_weights = weights["head_bn"]
+    hidden_kernel, hidden_bias = weights["hidden"]
+    logits_kernel, logits_bias = weights["logits"]
+    filters = _strongest(np.abs(kernel).sum(axis=(0, 1, 2)) * np.abs(bn_weights[0]), keep)
+    units = _strongest(np.abs(hidden_kernel[filters]).sum(axis=0), keep)
+
+    # Same graph with narrower layers; building from the config also leaves the original's layers untouched
+    config = student.get_config()
+    config["name"] = f"{student.name}_keep{int(keep * 100)}"
+    for layer in config["layers"]:
+        name = layer["config"]["name"]
+        block, part = _block_part(name)
+        if block in blocks and part == "expand":
+            layer["config"]["filters"] = len(blocks[block])
+        elif name == "head_conv":
+            layer["config"]["filters"] = len(filters)
+        elif name == "hidden":
+            layer["config"]["units"] = len(units)
+    pruned = Model.from_config(config)
+
+    for layer in pruned.layers:
+        block, part = _block_part(layer.name)
+        values = weights[layer.name]
+        if block in blocks:
+            channels = blocks[block]
+            if part in ("expand", "expand_BN", "depthwise_BN"):
+                values = [w[..., channels] for w in values]  # Output channels
+            elif part in ("depthwise", "project"):
+                values = [values[0][:, :, channels, :]]  # Input channels
+        elif layer.name == "head_conv":
+            values = [kernel[..., filters]]
+        elif layer.name == "head_bn":
+            values = [w[filters] for w in bn_weights]
+        elif layer.name == "hidden":
+            values = [hidden_kernel[filters][:, units], hidden_bias[units]]
+        elif layer.name == "logits":
+            values = [logits_kernel[units], logits_bias]
+        layer.set_weights(values)
+    return pruned
+
+
+class Distiller(Model):
+    # Trains the student on a mix of ground truth and the teacher's temperature-softened outputs.
+    # Batches arrive at the teacher's input size; the student sees them downscaled.
+    def __init__(self, teacher, student, multitask, temperature=TEMPERATURE, hard_weight=HARD_WEIGHT):
+        super().__init__()
+        self.teacher = teacher
+        self.student = student
+        self.student_logits = Model(student.input, student.get_layer("logits").output)
+        self.student_size = tuple(student.input_shape[1:3])
+        teacher_size = tuple(teacher.input_shape[1:3])
+        self.teacher_size = None if teacher_size == (IMG_HEIGHT, IMG_WIDTH) else teacher_size
+        self.multitask = multitask
+        self.temperature = temperature
+        self.hard_weight = hard_weight
+        self.trackers = {name: tf.keras.metrics.Mean(name=name)
+                         for name in ("loss", "hard_loss", "soft_loss", "accuracy")}
+
+    @property
+    def metrics(self):
+        # Reset by Keras at the start of every epoch / evaluation
+        return list(self.trackers.values())
+
+    def _hard_loss(self, labels, logits):
+        if self.multitask:
+            return tf.reduce_mean(masked_binary_crossentropy(labels, tf.sigmoid(logits)))
+        return tf.reduce_mean(tf.keras.losses.categorical_crossentropy(labels, logits, from_logits=True))
+
+    def _soft_loss(self, teacher_logits, logits):
+        t = self.temperature
+        if self.multitask:
+            # The teacher also labels the heads a dataset leaves unlabelled
+            loss = tf.keras.losses.binary_crossentropy(tf.sigmoid(teacher_logits / t), logits / t, from_logits=True)
+        else:
+            loss = tf.keras.losses.kl_divergence(tf.nn.softmax(teacher_logits / t), tf.nn.softmax(logits / t))
+        return tf.reduce_mean(loss) * t * t  # t^2 keeps gradient scale independent of the temperature
+
+    def _accuracy(self, labels, logits):
+        if self.multitask:
+            labelled = tf.cast(labels >= 0, tf.float32)
+            correct = tf.cast(tf.equal(labels, tf.cast(logits > 0, tf.float32)), tf.float32)
+            return tf.reduce_sum(correct * labelled) / tf.maximum(tf.reduce_sum(labelled), 1.0)
+        return tf.reduce_mean(tf.cast(tf.equal(tf.argmax(labels, -1), tf.argmax(logits, -1)), tf.float32))
+
+    def train_step(self, data):
+        images, labels = data
+        teacher_images = tf.image.resize(images, self.teacher_size) if self.teacher_size else images
+        teacher_logits = to_logits(self.teacher(teacher_images, training=False), self.multitask)
+        small = tf.image.resize(images, self.student_size)
+        with tf.GradientTape() as tape:
+            logits = self.student_logits(small, training=True)
+            hard = self._hard_loss(labels, logits)
+            soft = self._soft_loss(teacher_logits, logits)
+            loss = self.hard_weight * hard + (1.0 - self.hard_weight) * soft
+        variables = self.student_logits.trainable_variables
+        self.optimizer.apply_gradients(zip(tape.gradient(loss, variables), variables))
+        for name, value in (("loss", loss), ("hard_loss", hard), ("soft_loss", soft),
+                            ("accuracy", self._accuracy(labels, logits))):
+            self.trackers[name].update_state(value)
+        return {name: tracker.result() for name, tracker in self.trackers.items()}
+
+    def test_step(self, data):
+        # Validation on ground truth only: that's what early stopping should track
+        images, labels = data
+        logits = self.student_logits(tf.image.resize(images, self.student_size), training=False)
+        self.trackers["loss"].update_state(self._hard_loss(labels, logits))
+        self.trackers["accuracy"].update_state(self._accuracy(labels, logits))
+        return {"loss": self.trackers["loss"].result(), "accuracy": self.trackers["accuracy"].result()}
+
+    def call(self, images):
+        return self.student(tf.image.resize(images, self.student_size))
+
+
+def distill(teacher, student, multitask, train_dataset, val_dataset, train_count, epochs=EPOCHS,
+            learning_rate=LEARNING_RATE):
+    distiller = Distiller(teacher, student, multitask)
+    distiller.compile(optimizer=Adam(learning_rate=learning_rate))
+    early_stopping = EarlyStopping(monitor="val_loss", patience=3, restore_best_weights=True)
+    distiller.fit(train_dataset, epochs=epochs, validation_data=val_dataset,
+                  callbacks=[early_stopping, ThroughputCallback(train_count)])
+    return student
+
+
+def accuracy(labels, probs, multitask):
+    if multitask:
+        labelled = labels >= 0
+        return float(((probs > 0.5) == (labels > 0.5))[labelled].mean()) if labelled.any() else 0.0
+    return float((probs.argmax(axis=-1) == labels.argmax(axis=-1)).mean())
+
+
+def evaluate_candidate(name, model, tflite_path, test_dataset, multitask, threads=LATENCY_THREADS, **details):
+    # Measured on the exported TFLite model, i.e. what would actually ship
+    backend = TFLiteBackend(tflite_path, num_threads=threads)
+    width, height = backend.input_size
+    all_labels, all_probs = [], []
+    for images, labels in test_dataset:
+        if images.shape[1:3] != (height, width):
+            images = tf.image.resize(images, (height, width))
+        all_probs.append(backend.predict(images.numpy()))
+        all_labels.append(labels.numpy())
+    labels, probs = np.concatenate(all_labels), np.concatenate(all_probs)
+
+    sample = np.zeros((1, height, width, 3), dtype=np.float32)
+    timings = time_calls(lambda i: backend.predict(sample), LATENCY_RUNS)
+    result = {
+        "name": name, "input": f"{width}x{height}", "params": int(model.count_params()),
+        "size_kb": os.path.getsize(tflite_path) / 1024, "p50_ms": timings["p50_ms"], "p95_ms": timings["p95_ms"],
+        "accuracy": accuracy(labels, probs, multitask), "model": tflite_path, **details,
+    }
+    print(f"✅ {name}: accuracy {result['accuracy']:.4f}, {result['p50_ms']:.2f} ms, {result['size_kb']:.0f} KB")
+    return result
+
+
+def mark_pareto(results):
+    # Kept when no other candidate is at least as accurate, fast and small, and strictly better in one
+    def dominates(a, b):
+        return (a["accuracy"] >= b["accuracy"] and a["p50_ms"] <= b["p50_ms"] and a["size_kb"] <= b["size_kb"]
+                and (a["accuracy"] > b["accuracy"] or a["p50_ms"] < b["p50_ms"] or a["size_kb"] < b["size_kb"]))
+    for result in results:
+        result["pareto"] = not any(dominates(other, result) for other in results if other is not result)
+    return results
+
+
+def print_report(results, budget_ms=BUDGET_MS, threads=LATENCY_THREADS):
+    teacher_acc = results[0]["accuracy"]
+    print(f"\n📊 Pareto report (TFLite, {threads} thread(s), ★ = Pareto-optimal)")
+    print(f"{'Model':32} {'Input':>8} {'Params':>10} {'KB':>8} {'p50 ms':>8} {'p95 ms':>8} {'Acc':>7} {'ΔAcc':>7}")
+    for r in sorted(results, key=lambda r: r["p50_ms"]):
+        print(f"{'★ ' if r['pareto'] else '  '}{r['name']:30} {r['input']:>8} {r['params']:>10,} {r['size_kb']:8.0f} "
+              f"{r['p50_ms']:8.2f} {r['p95_ms']:8.2f} {r['accuracy']:7.4f} {r['accuracy'] - teacher_acc:+7.4f}")
+    fitting = [r for r in results if r["pareto"] and r["p50_ms"] <= budget_ms]
+    if fitting:
+        best = max(fitting, key=lambda r: r["accuracy"])
+        print(f"🏆 Best within {budget_ms:.1f} ms: {best['name']} ({best['model']})")
+    else:
+        print(f"⚠️ No candidate fits {budget_ms:.1f} ms on this machine")
+
+
+def run_distillation(teacher_path=TEACHER_PATH, alphas=ALPHAS, sizes=SIZES, keep_ratios=KEEP_RATIOS,
+                     output_dir=OUTPUT_DIR, epochs=EPOCHS, fine_tune_epochs=FINE_TUNE_EPOCHS, int8=False,
+                     threads=LATENCY_THREADS, budget_ms=BUDGET_MS, roots=(DATASET_PATH, YAWN_DATASET_PATH)):
+    teacher = tf.keras.models.load_model(teacher_path, compile=False)
+    num_outputs = teacher.output_shape[-1]
+    multitask = num_outputs == len(HEADS)  # Same datasets and loss as the teacher was trained with
+    if multitask:
+        train_dataset, val_dataset, test_dataset, train_count = build_multitask_datasets(roots)
+    else:
+        train_dataset, val_dataset, test_dataset, train_count = build_datasets()
+    os.makedirs(output_dir, exist_ok=True)
+
+    def export(model_path):
+        return export_tflite(model_path, os.path.splitext(model_path)[0] + ("_int8.tflite" if int8 else ".tflite"),
+                             int8=int8)
+
+    teacher_copy = os.path.join(output_dir, "teacher" + os.path.splitext(teacher_path)[1])
+    teacher.save(teacher_copy)
+    results = [evaluate_candidate("teacher", teacher, export(teacher_copy), test_dataset, multitask, threads)]
+
+    for alpha, size in itertools.product(alphas, sizes):
+        print(f"🎓 Distilling student: alpha {alpha}, {size}x{size}")
+        student = distill(teacher, build_student(alpha, size, num_outputs, multitask), multitask,
+                          train_dataset, val_dataset, train_count, epochs)
+        for keep in sorted(keep_ratios, reverse=True):
+            candidate = student
+            if keep < 1.0:
+                print(f"✂️ Pruning to {keep:.0%} of head channels, then fine-tuning")
+                candidate = distill(teacher, prune_student(student, keep, multitask), multitask, train_dataset,
+                                    val_dataset, train_count, fine_tune_epochs, LEARNING_RATE / 5)
+            name = f"student_a{alpha}_{size}px_keep{keep:.2f}"
+            model_path = os.path.join(output_dir, f"{name}.h5")
+            candidate.save(model_path)
+            results.append(evaluate_candidate(name, candidate, export(model_path), test_dataset, multitask, threads,
+                                              alpha=alpha, size=size, keep=keep))
+
+    mark_pareto(results)
+    print_report(results, budget_ms, threads)
+    report_path = os.path.join(output_dir, "pareto.json")
+    with open(report_path, "w") as f:
+        json.dump({"teacher": teacher_path, "threads": threads, "int8": int8, "budget_ms": budget_ms,
+                   "candidates": results}, f, indent=2)
+    print(f"✅ Report saved at: {report_path}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill and prune small student models, with a Pareto report")
+    parser.add_argument("--teacher", default=TEACHER_PATH, help="Trained Keras model from model.py")
+    parser.add_argument("--alphas", type=float, nargs="+", default=ALPHAS, help="MobileNetV2 width multipliers")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Student input resolutions")
+    parser.add_argument("--keep", type=float, nargs="+", default=KEEP_RATIOS,
+                        help="Fractions of channels kept by structured pruning, in the later backbone blocks "
+                             "and the head (1.0 = unpruned)")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--fine-tune-epochs", type=int, default=FINE_TUNE_EPOCHS)
+    parser.add_argument("--int8", action="store_true", help="Export and measure INT8-quantized TFLite students")
+    parser.add_argument("--threads", type=int, default=LATENCY_THREADS, help="Interpreter threads for latency")
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS, help="Per-frame classifier budget")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--dataset", action="append", help="Dataset roots for a multi-task teacher (repeatable)")
+    args = parser.parse_args()
+    run_distillation(args.teacher, args.alphas, args.sizes, args.keep, args.output_dir, args.epochs,
+                     args.fine_tune_epochs, args.int8, args.threads, args.budget_ms,
+                     args.dataset or (DATASET_PATH, YAWN_DATASET_PATH))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import numpy as np
+
+LEFT_EYE_INDICES = [33, 160, 158, 133, 153, 144]
+RIGHT_EYE_INDICES = [362, 385, 387, 263, 373, 380]
+EYE_INDICES = np.array([LEFT_EYE_INDICES, RIGHT_EYE_INDICES])  # (2 eyes, 6 points)
+# Inner lips in the same corner/top/top/corner/bottom/bottom order, so the EAR formula gives the
+# mouth aspect ratio (MAR): ~0.0-0.3 closed or talking, >0.6 wide open (yawning)
+MOUTH_INDICES = np.array([[78, 81, 311, 308, 402, 178]])
+
+# EAR = (|p1-p5| + |p2-p4|) / (2 |p0-p3|): gather all three pairs for both eyes at once
+_PAIR_A = [1, 2, 0]
+_PAIR_B = [5, 4, 3]
+
+# A serialized NormalizedLandmark with only x, y, z set is 17 bytes:
+# field tag + length, then (tag, float32) for each of x, y, z.
+_LANDMARK_RECORD = np.dtype([
+    ("tag", "u1"), ("length", "u1"),
+    ("x_tag", "u1"), ("x", "<f4"),
+    ("y_tag", "u1"), ("y", "<f4"),
+    ("z_tag", "u1"), ("z", "<f4"),
+])
+
+
+def landmarks_to_array(face_landmarks, width, height):
+    # (N, 3) float32 pixel coordinates (z scaled like x, as MediaPipe does).
+    # Decoding the protobuf bytes directly avoids ~1.4k Python attribute lookups per face.
+    data = face_landmarks.SerializeToString()
+    count = len(face_landmarks.landmark)
+    points = None
+    if len(data) == count * _LANDMARK_RECORD.itemsize:
+        records = np.frombuffer(data, dtype=_LANDMARK_RECORD)
+        if (np.all(records["tag"] == 0x0A) and np.all(records["length"] == 15) and np.all(records["x_tag"] == 0x0D)
+                and np.all(records["y_tag"] == 0x15) and np.all(records["z_tag"] == 0x1D)):
+            points = np.empty((count, 3), dtype=np.float32)
+            points[:, 0] = records["x"]
+            points[:, 1] = records["y"]
+            points[:, 2] = records["z"]
+    if points is None:
+        # Landmarks carrying visibility/presence don't fit the fixed layout
+        points = np.array([(lm.x, lm.y, lm.z) for lm in face_landmarks.landmark], dtype=np.float32)
+    points *= np.array([width, height, width], dtype=np.float32)
+    return points
+
+
+def eye_aspect_ratios(points, eye_indices=EYE_INDICES):
+    # points: (..., N, 2+) landmarks -> (..., 2) EAR for left and right eye
+    eyes = points[..., eye_indices, :2]
+    distances = np.linalg.norm(eyes[..., _PAIR_A, :] - eyes[..., _PAIR_B, :], axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (distances[..., 0] + distances[..., 1]) / (2.0 * distances[..., 2])
+
+
+def compute_ear(points, eye_indices=EYE_INDICES):
+    return float(eye_aspect_ratios(points, eye_indices).mean())
+
+
+def compute_mar(points):
+    return compute_ear(points, MOUTH_INDICES)
+
+
+def batch_ear(sequence, eye_indices=EYE_INDICES):
+    # sequence: (T, N, 2 or 3) landmarks for a recording, NaN rows where no face was found.
+    # Returns (T,) mean EAR per frame in one vectorized pass.
+    return eye_aspect_ratios(np.asarray(sequence, dtype=np.float32), eye_indices).mean(axis=-1)
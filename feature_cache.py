@@ -0,0 +1,193 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.applications import MobileNetV2
+from tensorflow.keras.callbacks import EarlyStopping
+from tensorflow.keras.layers import Dense, Dropout, GlobalAveragePooling2D, Input
+from tensorflow.keras.models import Sequential
+from tensorflow.keras.optimizers import Adam
+
+from model import DATASET_PATH, IMG_HEIGHT, IMG_WIDTH, decode_image, list_split
+
+# Embeddings of the frozen MobileNetV2 backbone (GlobalAveragePooling2D output),
+# computed once per image and reused for every head training run.
+CACHE_DIR = os.path.join(os.path.dirname(DATASET_PATH), "feature_cache")
+EMBED_BATCH_SIZE = 64
+HEAD_BATCH_SIZE = 256
+HEAD_EPOCHS = 50
+VARIANTS = ("none", "flip")  # Fixed augmentations that get their own embedding
+SWEEP_GRID = {"hidden": [64, 128, 256], "dropout": [0.3, 0.5], "lr": [1e-3, 3e-4]}
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, cache_dir=CACHE_DIR, dim=1280):
+        # One cache per input size: embeddings at 224 and 160 aren't interchangeable
+        self.cache_dir = os.path.join(cache_dir, f"{IMG_WIDTH}x{IMG_HEIGHT}")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.data_path = os.path.join(self.cache_dir, "embeddings.f32")
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        self.dim = dim
+        self.rows = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.rows = json.load(f)["rows"]
+        self._backbone = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def backbone(self):
+        if self._backbone is None:
+            self._backbone = MobileNetV2(weights="imagenet", include_top=False, pooling="avg",
+                                         input_shape=(IMG_HEIGHT, IMG_WIDTH, 3))
+        return self._backbone
+
+    def _open(self, mode="r"):
+        # np.memmap can't map an empty file: until the first append, the cache is an empty array
+        if not self.rows:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.memmap(self.data_path, dtype=np.float32, mode=mode, shape=(len(self.rows), self.dim))
+
+    def _save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"dim": self.dim, "rows": self.rows}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def embed(self, paths, variants=("none",)):
+        # Returns the cache keys for paths x variants, embedding only what isn't cached yet
+        with ThreadPoolExecutor() as pool:
+            hashes = list(pool.map(file_hash, paths))
+        keys = {variant: [f"{h}:{variant}" for h in hashes] for variant in variants}
+
+        for variant in variants:
+            missing = [(path, key) for path, key in zip(paths, keys[variant]) if key not in self.rows]
+            missing = list({key: path for path, key in missing}.items())  # Duplicate files embed once
+            if not missing:
+                continue
+            print(f"🧠 Embedding {len(missing)} new images ({variant})...")
+            dataset = tf.data.Dataset.from_tensor_slices([path for _, path in missing])
+            dataset = dataset.map(lambda p: decode_image(p, 0)[0], num_parallel_calls=tf.data.AUTOTUNE)
+            if variant == "flip":
+                dataset = dataset.map(tf.image.flip_left_right, num_parallel_calls=tf.data.AUTOTUNE)
+            dataset = dataset.map(lambda x: tf.cast(x, tf.float32) / 255.0)  # Same rescale as model.py
+            dataset = dataset.batch(EMBED_BATCH_SIZE).prefetch(tf.data.AUTOTUNE)
+
+            # Append to the raw float32 file, then record the new rows. Truncating first drops
+            # rows left behind by an interrupted run that never made it into the index.
+            with open(self.data_path, "ab") as f:
+                f.truncate(len(self.rows) * self.dim * 4)
+                for batch in dataset:
+                    f.write(self.backbone(batch, training=False).numpy().astype(np.float32).tobytes())
+            start = len(self.rows)
+            for offset, (key, _) in enumerate(missing):
+                self.rows[key] = start + offset
+            self._save_index()
+        return keys
+
+    def load(self, keys):
+        data = self._open()
+        return np.asarray(data[[self.rows[key] for key in keys]])
+
+
+def load_split_features(cache, split, variants=("none",)):
+    paths, labels, class_names = list_split(split)
+    keys = cache.embed(paths, variants)
+    features = np.concatenate([cache.load(keys[variant]) for variant in variants])
+    targets = np.tile(np.eye(len(class_names), dtype=np.float32)[labels], (len(variants), 1))
+    return features, targets, class_names
+
+
+def build_head(num_classes, dim=1280, hidden=128, dropout=0.5, lr=1e-3):
+    # Same layers that sit on top of the backbone in model.build_model
+    head = Sequential([
+        Input(shape=(dim,)),
+        Dense(hidden, activation="relu"),
+        Dropout(dropout),
+        Dense(num_classes, activation="softmax"),
+    ])
+    head.compile(optimizer=Adam(learning_rate=lr), loss="categorical_crossentropy", metrics=["accuracy"])
+    return head
+
+
+def train_head(train_data, val_data, hidden=128, dropout=0.5, lr=1e-3, epochs=HEAD_EPOCHS, verbose=0):
+    x_train, y_train = train_data
+    head = build_head(y_train.shape[1], x_train.shape[1], hidden, dropout, lr)
+    early_stopping = EarlyStopping(monitor="val_loss", patience=5, restore_best_weights=True)
+    head.fit(x_train, y_train, batch_size=HEAD_BATCH_SIZE, epochs=epochs, validation_data=val_data,
+             callbacks=[early_stopping], verbose=verbose)
+    _, val_acc = head.evaluate(*val_data, verbose=0)
+    return head, val_acc
+
+
+def sweep(train_data, val_data, grid=SWEEP_GRID):
+    results = []
+    for hidden, dropout, lr in itertools.product(grid["hidden"], grid["dropout"], grid["lr"]):
+        head, val_acc = train_head(train_data, val_data, hidden, dropout, lr)
+        results.append({"hidden": hidden, "dropout": dropout, "lr": lr, "val_acc": val_acc, "head": head})
+        print(f"   hidden={hidden:4d} dropout={dropout:.1f} lr={lr:.0e} -> val_acc={val_acc:.4f}")
+    return sorted(results, key=lambda r: r["val_acc"], reverse=True)
+
+
+def export_full_model(head, output_path):
+    # Re-attach the (ImageNet, frozen) backbone so the result is a drop-in replacement for model.py's output
+    hidden, dropout, output = head.layers
+    model = Sequential([
+        MobileNetV2(weights="imagenet", include_top=False, input_shape=(IMG_HEIGHT, IMG_WIDTH, 3)),
+        GlobalAveragePooling2D(),
+        Dense(hidden.units, activation="relu"),
+        Dropout(dropout.rate),
+        Dense(output.units, activation="softmax"),
+    ])
+    for target, source in zip(model.layers[2:], head.layers):
+        target.set_weights(source.get_weights())
+    model.save(output_path)
+    print(f"✅ Model saved at: {output_path}")
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the classifier head from cached backbone embeddings")
+    parser.add_argument("command", choices=["embed", "train", "sweep"])
+    parser.add_argument("--flip", action="store_true", help="Also cache horizontally flipped embeddings for training")
+    parser.add_argument("--hidden", type=int, default=128)
+    parser.add_argument("--dropout", type=float, default=0.5)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--epochs", type=int, default=HEAD_EPOCHS)
+    parser.add_argument("--output", default="drowsiness_model_4class.h5", help="Full model saved after train/sweep")
+    args = parser.parse_args()
+
+    cache = EmbeddingCache()
+    train_variants = VARIANTS if args.flip else ("none",)
+    train_data = load_split_features(cache, "train", train_variants)[:2]
+    val_data = load_split_features(cache, "validation")[:2]
+    test_data = load_split_features(cache, "test")[:2]
+    print(f"✅ {len(cache)} embeddings cached")
+    if args.command == "embed":
+        return
+
+    if args.command == "train":
+        head, val_acc = train_head(train_data, val_data, args.hidden, args.dropout, args.lr, args.epochs, verbose=1)
+    else:
+        best = sweep(train_data, val_data)[0]
+        head, val_acc = best["head"], best["val_acc"]
+        print(f"🏆 Best: hidden={best['hidden']} dropout={best['dropout']} lr={best['lr']:.0e}")
+    _, test_acc = head.evaluate(*test_data, verbose=0)
+    print(f"✅ Validation Accuracy: {val_acc:.4f} | Test Accuracy: {test_acc:.4f}")
+    export_full_model(head, args.output)
+
+
+if __name__ == "__main__":
+    main()
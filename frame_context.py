@@ -0,0 +1,67 @@
+from collections import deque
+
+import cv2
+import numpy as np
+
+INV_255 = np.float32(1.0 / 255.0)
+
+
+class FrameContext:
+    # Everything one camera frame needs on its way through the pipeline. The image
+    # buffers are allocated on first use and then reused (cv2 dst=, numpy out=), so a
+    # recycled context costs no heap allocations per frame.
+    __slots__ = ("frame_id", "captured_at", "raw", "frame", "rgb", "resized", "input", "rgb_ready",
+                 "ear", "mar", "eyes_closed_long", "probs", "drowsy_by_model", "face_box", "latency")
+
+    def __init__(self, input_size):
+        width, height = input_size
+        self.raw = None  # Camera buffer as read
+        self.frame = None  # BGR frame used for analysis and display
+        self.rgb = None
+        self.resized = None
+        self.input = np.zeros((1, height, width, 3), dtype=np.float32)
+        self.prepare(0, 0.0)
+
+    def prepare(self, frame_id, captured_at):
+        self.frame_id = frame_id
+        self.captured_at = captured_at
+        self.rgb_ready = False
+        self.ear = None
+        self.mar = None
+        self.eyes_closed_long = False
+        self.probs = None  # Class probabilities when the CNN ran on this frame
+        self.drowsy_by_model = False
+        self.face_box = None
+        self.latency = None
+
+    def get_rgb(self):
+        # Converted once per frame and shared by FaceMesh and the classifier
+        if not self.rgb_ready:
+            self.rgb = cv2.cvtColor(self.frame, cv2.COLOR_BGR2RGB, dst=self.rgb)
+            self.rgb_ready = True
+        return self.rgb
+
+    def fill_input(self, box=None):
+        rgb = self.get_rgb()
+        if box is not None:
+            x1, y1, x2, y2 = box
+            rgb = rgb[y1:y2, x1:x2]
+        height, width = self.input.shape[1:3]
+        self.resized = cv2.resize(rgb, (width, height), dst=self.resized)
+        np.multiply(self.resized, INV_255, out=self.input[0], casting="unsafe")
+        return self.input
+
+
+class FramePool:
+    def __init__(self, input_size, size):
+        self.input_size = input_size
+        self._free = deque(FrameContext(input_size) for _ in range(size))
+
+    def acquire(self):
+        try:
+            return self._free.popleft()
+        except IndexError:
+            return FrameContext(self.input_size)  # Only if every context is in flight
+
+    def release(self, ctx):
+        self._free.append(ctx)
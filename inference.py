@@ -0,0 +1,301 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from multitask import DEFAULT_HEAD_THRESHOLDS, HEADS, head_probabilities
+
+# TensorFlow, tflite_runtime and onnxruntime are imported only by the backend that needs
+# them: importing TensorFlow alone takes seconds, and a TFLite-only start shouldn't pay for it.
+BACKENDS = ("keras", "tflite", "onnx")
+BACKEND_EXTENSIONS = {".h5": "keras", ".keras": "keras", ".tflite": "tflite", ".onnx": "onnx"}
+DEFAULT_INPUT_SIZE = (224, 224)
+CALIBRATION_STEPS = 100  # Validation images used for INT8 calibration
+NUM_THREADS = os.cpu_count() or 1
+
+
+def _tflite_interpreter():
+    # The lightweight runtime is preferred on in-cab units where the full TensorFlow wheel isn't installed
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class KerasBackend:
+    name = "keras"
+
+    def __init__(self, model_path):
+        import tensorflow as tf
+
+        # compile=False: inference needs no loss, and the multi-task model's masked loss is custom
+        self.model = tf.keras.models.load_model(model_path, compile=False)
+        self.input_size = _spatial_size(self.model.input_shape)
+        self.output_size = int(self.model.output_shape[-1])
+
+    def predict(self, batch):
+        # Calling the model directly skips model.predict's per-call batching and callback setup
+        return self.model(batch, training=False).numpy()
+
+
+class TFLiteBackend:
+    name = "tflite"
+
+    def __init__(self, model_path, num_threads=NUM_THREADS):
+        with open(model_path, "rb") as f:
+            self.model_content = f.read()
+        self.num_threads = num_threads
+        self._interpreters = {}  # Input shape -> (interpreter, input detail, output detail)
+        self._use(self._load())
+        self.input_size = _spatial_size(self.input_shape)
+        self.output_size = int(self.output_detail["shape"][-1])
+
+    def _load(self, shape=None):
+        interpreter = _tflite_interpreter()(model_content=self.model_content, num_threads=self.num_threads)
+        if shape is not None:
+            interpreter.resize_tensor_input(interpreter.get_input_details()[0]["index"], list(shape))
+        interpreter.allocate_tensors()
+        entry = (interpreter, interpreter.get_input_details()[0], interpreter.get_output_details()[0])
+        self._interpreters[tuple(int(d) for d in entry[1]["shape"])] = entry
+        return entry
+
+    def _use(self, entry):
+        self.interpreter, self.input_detail, self.output_detail = entry
+        self.input_shape = tuple(int(d) for d in self.input_detail["shape"])
+
+    def resize_input(self, shape):
+        # MobileNetV2 + GlobalAveragePooling2D is spatially agnostic, so the model can take a
+        # different batch size or a smaller input resolution. Each shape gets its own interpreter,
+        # allocated once, so callers alternating between batch sizes never reallocate tensors.
+        shape = tuple(int(d) for d in shape)
+        self._use(self._interpreters.get(shape) or self._load(shape))
+        self.input_size = _spatial_size(self.input_shape)
+
+    def predict(self, batch):
+        if batch.shape != self.input_shape:
+            self.resize_input(batch.shape)
+
+        # INT8 models take quantized input and return quantized output
+        scale, zero_point = self.input_detail["quantization"]
+        if self.input_detail["dtype"] != np.float32 and scale:
+            batch = quantize(batch, scale, zero_point, self.input_detail["dtype"])
+        self.interpreter.set_tensor(self.input_detail["index"], batch.astype(self.input_detail["dtype"], copy=False))
+        self.interpreter.invoke()
+        output = self.interpreter.get_tensor(self.output_detail["index"])
+
+        scale, zero_point = self.output_detail["quantization"]
+        if self.output_detail["dtype"] != np.float32 and scale:
+            output = dequantize(output, scale, zero_point)
+        return output
+
+
+class ONNXBackend:
+    name = "onnx"
+
+    def __init__(self, model_path, num_threads=NUM_THREADS):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("onnxruntime is not installed. Run: pip install onnxruntime")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.input_size = _spatial_size(self.session.get_inputs()[0].shape)
+        self.output_size = int(self.session.get_outputs()[0].shape[-1])
+
+    def predict(self, batch):
+        return self.session.run(None, {self.input_name: batch.astype(np.float32, copy=False)})[0]
+
+
+def quantize(values, scale, zero_point, dtype):
+    # Clipped to the integer range first: inputs outside the calibrated range would otherwise wrap around
+    info = np.iinfo(dtype)
+    return np.clip(np.round(values / scale + zero_point), info.min, info.max).astype(dtype)
+
+
+def dequantize(values, scale, zero_point):
+    return (values.astype(np.float32) - zero_point) * scale
+
+
+def _spatial_size(shape):
+    # (batch, height, width, channels) -> (width, height) as cv2.resize expects
+    height, width = shape[1], shape[2]
+    if height is None or width is None or isinstance(height, str) or isinstance(width, str):
+        return DEFAULT_INPUT_SIZE  # Dynamic spatial dims (e.g. ONNX symbolic axes)
+    return (int(width), int(height))
+
+
+def fast_model_path(model_path):
+    # Sibling TFLite file for a Keras model: loads in milliseconds instead of rebuilding the Keras graph
+    return os.path.splitext(model_path)[0] + ".tflite"
+
+
+def load_backend(model_path, backend=None, prefer_fast=False):
+    if backend is None:
+        backend = BACKEND_EXTENSIONS.get(os.path.splitext(model_path)[1].lower(), "keras")
+        fast_path = fast_model_path(model_path)
+        if (prefer_fast and backend == "keras" and os.path.exists(fast_path)
+                and os.path.getmtime(fast_path) >= os.path.getmtime(model_path)):
+            print(f"⚡ Using fast-loading model: {fast_path}")
+            model_path, backend = fast_path, "tflite"
+    if backend == "keras":
+        return KerasBackend(model_path)
+    if backend == "tflite":
+        return TFLiteBackend(model_path)
+    if backend == "onnx":
+        return ONNXBackend(model_path)
+    raise ValueError(f"Unknown backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+
+
+def representative_dataset(steps=CALIBRATION_STEPS, input_size=DEFAULT_INPUT_SIZE):
+    import tensorflow as tf
+    from model import build_eval_generator
+
+    val_generator = build_eval_generator("validation", batch_size=1)
+    for _ in range(min(steps, len(val_generator))):
+        images, _ = next(val_generator)
+        if images.shape[1:3] != (input_size[1], input_size[0]):
+            images = tf.image.resize(images, (input_size[1], input_size[0])).numpy()  # Smaller students
+        yield [images.astype(np.float32)]
+
+
+def export_tflite(model_path, output_path=None, int8=False, calibration_steps=CALIBRATION_STEPS):
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(model_path, compile=False)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if int8:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        input_size = _spatial_size(model.input_shape)
+        converter.representative_dataset = lambda: representative_dataset(calibration_steps, input_size)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+    output_path = output_path or os.path.splitext(model_path)[0] + ("_int8.tflite" if int8 else ".tflite")
+    with open(output_path, "wb") as f:
+        f.write(converter.convert())
+    print(f"✅ TFLite model saved at: {output_path}")
+    return output_path
+
+
+def export_onnx(model_path, output_path=None):
+    try:
+        import tf2onnx
+    except ImportError:
+        raise ImportError("tf2onnx is not installed. Run: pip install tf2onnx")
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(model_path, compile=False)
+    spec = (tf.TensorSpec((None, *model.input_shape[1:]), tf.float32, name="input"),)
+    output_path = output_path or os.path.splitext(model_path)[0] + ".onnx"
+    tf2onnx.convert.from_keras(model, input_signature=spec, output_path=output_path)
+    print(f"✅ ONNX model saved at: {output_path}")
+    return output_path
+
+
+def validation_samples(multitask, steps):
+    # (image, labels) batches of one: one-hot classes for the 4-class model; per-head 1/0/-1 labels
+    # for the multi-task model, spread evenly over the split so every head's datasets are sampled
+    from model import DATASET_PATH, YAWN_DATASET_PATH, build_eval_generator, decode_image, list_multitask_split
+
+    if not multitask:
+        val_generator = build_eval_generator("validation", batch_size=1, shuffle=False)
+        for i in range(min(steps, len(val_generator))):
+            yield val_generator[i]
+        return
+    paths, targets = list_multitask_split("validation", (DATASET_PATH, YAWN_DATASET_PATH))
+    for i in np.linspace(0, len(paths) - 1, min(steps, len(paths))).astype(int):
+        image, _ = decode_image(paths[i], targets[i])  # Same decode and resize as training
+        yield image.numpy()[np.newaxis] / 255.0, targets[i][np.newaxis]
+
+
+def evaluate_backend(backend, steps, warmup=5, head_thresholds=None):
+    # 4-class models: argmax against the class label. Multi-task models: each head against the
+    # runtime head threshold, scored only on images whose class carries a label for that head.
+    multitask = backend.output_size == len(HEADS)
+    thresholds = {**DEFAULT_HEAD_THRESHOLDS, **(head_thresholds or {})}
+    heads = HEADS if multitask else ("class",)
+    correct, labelled = dict.fromkeys(heads, 0), dict.fromkeys(heads, 0)
+    latencies, predictions = [], []
+    for i, (images, labels) in enumerate(validation_samples(multitask, steps)):
+        images = images.astype(np.float32)
+        if i < warmup:
+            backend.predict(images)
+        start = time.perf_counter()
+        output = backend.predict(images)
+        latencies.append(time.perf_counter() - start)
+        if multitask:
+            probs = head_probabilities(output[0])
+            predictions.append(tuple(int(probs[head] > thresholds[head]) for head in HEADS))
+            for head, verdict, label in zip(HEADS, predictions[-1], labels[0]):
+                if label >= 0:  # -1: this image's class says nothing about the head
+                    labelled[head] += 1
+                    correct[head] += int(verdict == label)
+        else:
+            predictions.append(int(np.argmax(output[0])))
+            labelled["class"] += 1
+            correct["class"] += int(predictions[-1] == np.argmax(labels[0]))
+    latencies = np.array(latencies) * 1000
+    return {
+        "backend": backend.name,
+        "multitask": multitask,
+        "accuracy": {head: correct[head] / labelled[head] if labelled[head] else 0.0 for head in heads},
+        "mean_ms": float(latencies.mean()) if len(latencies) else 0.0,
+        "p95_ms": float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+        "predictions": predictions,
+    }
+
+
+def compare_backends(model_paths, steps=200):
+    # The first model is the reference (normally the Keras .h5)
+    backends = [load_backend(path) for path in model_paths]
+    if len({backend.output_size == len(HEADS) for backend in backends}) > 1:
+        raise ValueError("Can't compare 4-class and multi-task models: their outputs mean different things")
+    results = [evaluate_backend(backend, steps) for backend in backends]
+    reference = results[0]
+    heads = list(reference["accuracy"])
+    # One accuracy column per head for multi-task models; ΔAcc averages the heads
+    print(f"{'Model':40} {'Backend':8} {'Mean ms':>8} {'P95 ms':>8} "
+          + " ".join(f"{'Acc' if head == 'class' else head[:11]:>11}" for head in heads) + f" {'ΔAcc':>7} {'Agree':>7}")
+    for path, result in zip(model_paths, results):
+        agreement = np.mean([p == r for p, r in zip(result["predictions"], reference["predictions"])])
+        delta = np.mean([result["accuracy"][head] - reference["accuracy"][head] for head in heads])
+        print(f"{os.path.basename(path):40} {result['backend']:8} {result['mean_ms']:8.2f} {result['p95_ms']:8.2f} "
+              + " ".join(f"{result['accuracy'][head]:11.4f}" for head in heads) + f" {delta:+7.4f} {agreement:7.2%}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and compare inference backends for the drowsiness model")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Convert a Keras model to TFLite or ONNX")
+    export_parser.add_argument("model", help="Path to the Keras .h5 model")
+    export_parser.add_argument("--format", choices=["tflite", "onnx"], default="tflite")
+    export_parser.add_argument("--int8", action="store_true", help="Post-training INT8 quantization (TFLite only)")
+    export_parser.add_argument("--calibration-steps", type=int, default=CALIBRATION_STEPS)
+    export_parser.add_argument("--output", help="Output path")
+
+    compare_parser = subparsers.add_parser("compare", help="Latency and accuracy of each model on the validation set")
+    compare_parser.add_argument("models", nargs="+", help="Model files; the first is the reference")
+    compare_parser.add_argument("--steps", type=int, default=200)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        if args.format == "tflite":
+            export_tflite(args.model, args.output, args.int8, args.calibration_steps)
+        else:
+            if args.int8:
+                print("⚠️ INT8 quantization is only supported for TFLite export; exporting float ONNX.")
+            export_onnx(args.model, args.output)
+    else:
+        compare_backends(args.models, args.steps)
+
+
+if __name__ == "__main__":
+    main()
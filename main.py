@@ -1,6 +1,18 @@
+import inspect
 import streamlit as st
 import subprocess
-import threading
+import sys
+import time
+
+from preview import PreviewReader
+from service import ServiceClient, TelemetryFeed
+
+SERVICE_STARTUP_TIMEOUT = 60  # Seconds to wait for the model to load on first start
+STATUS_REFRESH_SECONDS = 1
+PREVIEW_REFRESH_SECONDS = 0.2
+# Older Streamlit releases only know use_column_width for st.image
+IMAGE_FIT_ARG = ("use_container_width" if "use_container_width" in inspect.signature(st.image).parameters
+                 else "use_column_width")
 
 # Force Streamlit to use a light theme and expand sidebar
 st.set_page_config(page_title="Drowsiness Detection Dashboard", layout="wide", initial_sidebar_state="expanded")
@@ -180,27 +192,96 @@ st.markdown(
 # Main Title
 st.markdown("<h1 class='main-title'>Driver Drowsiness Detection System</h1>", unsafe_allow_html=True)
 
-# Centered Start/Stop Buttons and Credit
-if "detection_process" not in st.session_state:
-    st.session_state.detection_process = None
-    st.session_state.detection_running = False
+# Detector service: loaded once, then started / stopped / paused over its local socket
+client = ServiceClient()
+if "service_process" not in st.session_state:
+    st.session_state.service_process = None
+
+def open_feed():
+    return TelemetryFeed(client)
+
+# Live status arrives over one subscription; the refreshing fragments only read it from memory.
+# Shared by every browser session where Streamlit can cache resources, per session otherwise.
+if hasattr(st, "cache_resource"):
+    feed = st.cache_resource(open_feed)()
+else:
+    if "feed" not in st.session_state:
+        st.session_state.feed = open_feed()
+    feed = st.session_state.feed
+
+def ensure_service():
+    if client.available():
+        return True
+    st.session_state.service_process = subprocess.Popen([sys.executable, "service.py", "--headless"])
+    deadline = time.time() + SERVICE_STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if client.available():
+            return True
+        time.sleep(0.5)
+    return False
+
+def send_command(command, message=None, **kwargs):
+    try:
+        client.send(command, **kwargs)
+        if message:
+            st.success(message)
+    except (OSError, EOFError, TimeoutError, RuntimeError) as e:
+        st.error(f"❌ {command} failed: {e}")
 
 def start_detection():
-    if not st.session_state.detection_running:
-        st.session_state.detection_running = True
-        st.session_state.detection_process = subprocess.Popen(["python", "detection.py"])
-        st.success("✅ Detection started. Check the OpenCV window.")
+    if not ensure_service():
+        st.error("❌ Detector service did not come up.")
+        return
+    send_command("start", "✅ Detection started.")
 
 def stop_detection():
-    if st.session_state.detection_running and st.session_state.detection_process:
-        st.session_state.detection_process.terminate()
-        st.session_state.detection_process = None
-        st.session_state.detection_running = False
-        st.success("🛑 Detection stopped.")
+    send_command("stop", "🛑 Detection stopped.")
+
+def toggle_pause():
+    if get_state().get("paused"):
+        send_command("resume", "▶️ Detection resumed.")
+    else:
+        send_command("pause", "⏸️ Detection paused.")
+
+def shutdown_service():
+    send_command("shutdown", "✅ Detector service shut down (camera, FaceMesh and audio released).")
+
+def get_state():
+    try:
+        return client.status()["state"]
+    except (OSError, EOFError, TimeoutError, RuntimeError):
+        return {}
+
+state = get_state()
+detection_running = state.get("running", False)
+detection_paused = state.get("paused", False)
+
+# Live settings: applied to the running detector, no model reload
+with st.sidebar:
+    st.markdown("<h2>Detector Settings</h2>", unsafe_allow_html=True)
+    driver_id = st.text_input("Driver ID", value=state.get("driver") or "",
+                              help="Loads the driver's calibrated EAR thresholds, or calibrates them while driving")
+    recalibrate = st.checkbox("Recalibrate")
+    if st.button("Load Driver", disabled=not (state and driver_id)):
+        send_command("driver", f"✅ Driver {driver_id} loaded.", driver_id=driver_id, recalibrate=recalibrate)
+    # Sliders start from the detector's current (possibly calibrated) values; only what was moved is sent
+    current = {"blink_threshold": round(min(max(state.get("blink_threshold", 0.25), 0.10), 0.40), 2),
+               "blink_duration_threshold": min(max(state.get("blink_duration_threshold", 3.5), 1.0), 10.0)}
+    settings = {
+        "blink_threshold": st.slider("Eyes-closed EAR threshold", 0.10, 0.40, current["blink_threshold"], 0.01),
+        "blink_duration_threshold": st.slider("Eyes-closed alarm after (s)", 1.0, 10.0,
+                                              float(current["blink_duration_threshold"]), 0.5),
+    }
+    changed = {key: value for key, value in settings.items() if value != current[key]}
+    if st.button("Apply Settings", disabled=not (state and changed)):
+        send_command("configure", "✅ Settings applied.", **changed)
+    if state:
+        st.button("⏻ Shut Down Detector", on_click=shutdown_service,
+                  help="Stop detection and unload the model, releasing the camera, FaceMesh and audio")
 
 # Button container
 st.markdown("<div class='button-container'>", unsafe_allow_html=True)
-if not st.session_state.detection_running:
+if not detection_running:
     st.button("▶️ Start Detection", key="start", on_click=start_detection, 
               help="Start the drowsiness detection system", 
               use_container_width=False)
@@ -208,15 +289,64 @@ else:
     st.button("🛑 Stop Detection", key="stop", on_click=stop_detection, 
               help="Stop the drowsiness detection system", 
               use_container_width=False)
+    st.button("▶️ Resume" if detection_paused else "⏸️ Pause", key="pause", on_click=toggle_pause,
+              help="Suspend detection without releasing the camera")
 st.markdown("</div>", unsafe_allow_html=True)
 
 st.markdown("<p style='text-align: center; color: #6c757d;'>Built by Arhaan Arif, Enrollment No: 2021-310-043</p>", unsafe_allow_html=True)
 
-# Status Indicator
-if st.session_state.detection_running:
-    st.markdown("<p style='text-align: center; color: #28a745; font-weight: bold;'>Detection Running...</p>", unsafe_allow_html=True)
-else:
-    st.markdown("<p style='text-align: center; color: #6c757d;'>Detection Stopped</p>", unsafe_allow_html=True)
+# Live status, EAR chart and video preview streamed back from the service
+def show_live_status():
+    state = feed.latest
+    if hasattr(st, "fragment") and feed.connected and (state.get("running", False), state.get("paused", False)) != (
+            detection_running, detection_paused):
+        st.rerun()  # Started, stopped or paused since the page was drawn: refresh the buttons too
+    if state.get("running"):
+        label = "Detection Paused" if state.get("paused") else "Detection Running..."
+        st.markdown(f"<p style='text-align: center; color: #28a745; font-weight: bold;'>{label}</p>", unsafe_allow_html=True)
+        col_status, col_ear, col_fps = st.columns(3)
+        col_status.metric("Status", state.get("status", "-"))
+        ear = state.get("ear")
+        col_ear.metric("EAR", f"{ear:.3f}" if ear is not None else "-")
+        col_fps.metric("FPS", f"{state.get('fps', 0.0):.1f}")
+        col_perclos, col_blinks, col_yawns = st.columns(3)
+        col_perclos.metric("PERCLOS", f"{state.get('perclos', 0.0):.0%}")
+        col_blinks.metric("Blinks/min", f"{state.get('blinks_per_min', 0.0):.0f}")
+        col_yawns.metric("Yawns (5 min)", state.get("yawns", 0))
+        if state.get("calibration") is not None:
+            st.progress(state["calibration"], text=f"Calibrating EAR thresholds for driver {state.get('driver')}...")
+        history = [h for h in list(feed.history) if h.get("running")]
+        if history:
+            st.line_chart({
+                "EAR": [h["ear"] if h.get("ear") is not None else float("nan") for h in history],
+                "Threshold": [h.get("blink_threshold", settings["blink_threshold"]) for h in history],
+            }, height=220)
+    else:
+        st.markdown("<p style='text-align: center; color: #6c757d;'>Detection Stopped</p>", unsafe_allow_html=True)
+
+def show_preview():
+    # Reads the latest frame out of shared memory; the detector never waits for the dashboard
+    if "preview_reader" not in st.session_state:
+        st.session_state.preview_reader = PreviewReader()
+    # Running flag from the live feed, not the page-level one: this fragment refreshes without a page rerun
+    frame = st.session_state.preview_reader.latest() if feed.latest.get("running") else None
+    if frame is not None:
+        st.image(frame, channels="BGR", **{IMAGE_FIT_ARG: True})
+    else:
+        st.markdown("<p style='text-align: center; color: #6c757d;'>No video yet</p>", unsafe_allow_html=True)
+
+def live(fn, seconds):
+    # Fragments refresh on their own without rerunning the whole page (newer Streamlit only)
+    if hasattr(st, "fragment"):
+        st.fragment(run_every=seconds)(fn)()
+    else:
+        fn()
+
+col_preview, col_live = st.columns([3, 2])
+with col_preview:
+    live(show_preview, PREVIEW_REFRESH_SECONDS)
+with col_live:
+    live(show_live_status, STATUS_REFRESH_SECONDS)
 
 # Key Features Section
 st.markdown("<h2 class='subheader'>Key Features</h2>", unsafe_allow_html=True)
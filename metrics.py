@@ -0,0 +1,196 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+WINDOW = 512  # Samples per stage kept for percentiles
+METRICS_HOST = "127.0.0.1"
+METRIC_PREFIX = "drowziguard"
+QUANTILES = (0.5, 0.95, 0.99)
+TIMING_ITERATIONS = 100  # Timed calls per time_calls() measurement
+TIMING_WARMUP = 10
+
+
+class RollingStats:
+    # Fixed-size ring buffer of durations (seconds); percentiles over the filled part
+    def __init__(self, window=WINDOW):
+        self._values = np.zeros(window, dtype=np.float64)
+        self._index = 0
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value):
+        self._values[self._index] = value
+        self._index = (self._index + 1) % len(self._values)
+        self.count += 1
+        self.total += value
+
+    def percentiles(self, quantiles=QUANTILES):
+        filled = self._values[:min(self.count, len(self._values))]
+        if not len(filled):
+            return [0.0] * len(quantiles)
+        return list(np.quantile(filled, quantiles))
+
+
+def time_calls(fn, iterations=TIMING_ITERATIONS, warmup=TIMING_WARMUP):
+    # Cold: the very first call (lazy init, graph tracing, caches). Warm: after warmup.
+    start = time.perf_counter()
+    fn(0)
+    cold = time.perf_counter() - start
+    for i in range(warmup):
+        fn(i)
+    samples = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        samples[i] = time.perf_counter() - start
+    samples *= 1000
+    return {"cold_ms": cold * 1000, "mean_ms": float(samples.mean()), "p50_ms": float(np.percentile(samples, 50)),
+            "p95_ms": float(np.percentile(samples, 95))}
+
+
+class TraceRecorder:
+    # Chrome trace (chrome://tracing, Perfetto) of every timed call for a fixed window. The window
+    # opens at start() or the first timed call, not at construction (model loading can take longer
+    # than the whole window).
+    def __init__(self, path, duration):
+        self.path = path
+        self.duration = duration
+        self.deadline = None
+        self.origin = None
+        self.events = []
+        self.done = False
+        self._lock = threading.Lock()
+
+    def start(self, now=None):
+        if self.deadline is None:
+            self.origin = time.perf_counter() if now is None else now
+            self.deadline = self.origin + self.duration
+
+    def add(self, name, start, end):
+        if self.done:
+            return
+        self.start(start)
+        if end > self.deadline:
+            self.dump()
+            return
+        with self._lock:
+            self.events.append({"name": name, "ph": "X", "pid": 0, "tid": threading.get_ident(),
+                                "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6})
+
+    def dump(self):
+        with self._lock:
+            if self.done:
+                return
+            self.done = True
+            with open(self.path, "w") as f:
+                json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+        print(f"✅ Trace with {len(self.events)} events saved at: {self.path}")
+
+
+class Profiler:
+    # Per-stage timers for the detection loop. Only created when profiling or metrics
+    # are requested; without one, the detector skips timing entirely.
+    def __init__(self, trace_path=None, trace_seconds=None):
+        self.stages = {}
+        self.gauges = {}
+        self.frames = 0
+        self.started_at = time.perf_counter()
+        self._frame_times = RollingStats()
+        self._last_frame = None
+        self.trace = TraceRecorder(trace_path, trace_seconds) if trace_path and trace_seconds else None
+
+    def add(self, name, duration):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = RollingStats()
+        stats.add(duration)
+
+    def record(self, name, start, end=None):
+        end = end or time.perf_counter()
+        self.add(name, end - start)
+        if self.trace:
+            self.trace.add(name, start, end)
+
+    def call(self, name, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.record(name, start)
+
+    def wrap(self, name, fn):
+        def timed(*args):
+            return self.call(name, fn, *args)
+        timed.__name__ = getattr(fn, "__name__", name)
+        return timed
+
+    def frame(self):
+        now = time.perf_counter()
+        if self._last_frame is not None:
+            self._frame_times.add(now - self._last_frame)
+        self._last_frame = now
+        self.frames += 1
+
+    @property
+    def fps(self):
+        p50 = self._frame_times.percentiles((0.5,))[0]
+        return 1.0 / p50 if p50 > 0 else 0.0
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    def summary(self):
+        lines = [f"⏱️ Stage timings over {self.frames} frames ({self.fps:.1f} FPS):"]
+        for name, stats in self.stages.items():
+            p50, p95, p99 = (v * 1000 for v in stats.percentiles())
+            lines.append(f"   {name:12} p50 {p50:7.2f} ms | p95 {p95:7.2f} ms | p99 {p99:7.2f} ms | n={stats.count}")
+        return "\n".join(lines)
+
+    def prometheus(self):
+        name = f"{METRIC_PREFIX}_stage_seconds"
+        lines = [f"# HELP {name} Duration of each detection stage.", f"# TYPE {name} summary"]
+        for stage, stats in list(self.stages.items()):
+            for q, value in zip(QUANTILES, stats.percentiles()):
+                lines.append(f'{name}{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {stats.total:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {stats.count}')
+        lines += [f"# TYPE {METRIC_PREFIX}_fps gauge", f"{METRIC_PREFIX}_fps {self.fps:.3f}",
+                  f"# TYPE {METRIC_PREFIX}_frames_total counter", f"{METRIC_PREFIX}_frames_total {self.frames}"]
+        for gauge, value in list(self.gauges.items()):
+            lines += [f"# TYPE {METRIC_PREFIX}_{gauge} gauge", f"{METRIC_PREFIX}_{gauge} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    # Local Prometheus scrape endpoint: GET http://127.0.0.1:<port>/metrics
+    def __init__(self, profiler, port, host=METRICS_HOST):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = profiler.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # Keep scrapes out of the console
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        host, port = self.server.server_address[:2]
+        print(f"📈 Metrics at http://{host}:{port}/metrics")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
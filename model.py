@@ -1,110 +1,325 @@
+import hashlib
 import os
+import time
 import numpy as np
 import tensorflow as tf
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import GlobalAveragePooling2D, Dense, Dropout
+from tensorflow.keras.models import Model, Sequential
+from tensorflow.keras.layers import Concatenate, GlobalAveragePooling2D, Dense, Dropout, Input
 from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.callbacks import ReduceLROnPlateau, EarlyStopping
+from tensorflow.keras.callbacks import Callback, ReduceLROnPlateau, EarlyStopping
 from tensorflow.keras.optimizers import Adam
 
+from multitask import HEADS, head_labels
+
 # Paths
 DATASET_PATH = "/content/dataset/dataset"
+YAWN_DATASET_PATH = "/content/dataset/yawning_dataset"  # Output of Utils/yawn_organize.py, for the multi-task model
 IMG_WIDTH, IMG_HEIGHT = 224, 224  # Update to match MobileNetV2 default
 BATCH_SIZE = 32
 EPOCHS = 10
+USE_TF_DATA = True  # Parallel, cached tf.data input pipeline instead of ImageDataGenerator
+CACHE_DIR = os.path.join(os.path.dirname(DATASET_PATH), "tf_cache")  # Decoded + resized images
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+AUTOTUNE = tf.data.AUTOTUNE
+
+def build_generators():
+    # Data augmentation
+    train_datagen = ImageDataGenerator(
+        rescale=1./255,
+        rotation_range=30,
+        width_shift_range=0.3,
+        height_shift_range=0.3,
+        shear_range=0.2,
+        zoom_range=0.3,
+        horizontal_flip=True,
+        fill_mode="nearest"
+    )
+
+    # Train generator
+    train_generator = train_datagen.flow_from_directory(
+        os.path.join(DATASET_PATH, "train"),
+        target_size=(IMG_WIDTH, IMG_HEIGHT),
+        batch_size=BATCH_SIZE,
+        class_mode="categorical",
+        color_mode="rgb"  # force 3-channel
+    )
+
+    # Validation generator
+    val_generator = build_eval_generator("validation")
+
+    # Test generator
+    test_generator = build_eval_generator("test")
+
+    return train_generator, val_generator, test_generator
+
+
+def build_eval_generator(split, batch_size=BATCH_SIZE, shuffle=True):
+    test_datagen = ImageDataGenerator(rescale=1./255)
+    return test_datagen.flow_from_directory(
+        os.path.join(DATASET_PATH, split),
+        target_size=(IMG_WIDTH, IMG_HEIGHT),
+        batch_size=batch_size,
+        class_mode="categorical",
+        color_mode="rgb",
+        shuffle=shuffle
+    )
+
+
+def list_split(split, root=DATASET_PATH):
+    # Same class order as flow_from_directory: sorted sub-directory names
+    split_dir = os.path.join(root, split)
+    class_names = sorted(d for d in os.listdir(split_dir) if os.path.isdir(os.path.join(split_dir, d)))
+    paths, labels = [], []
+    for label, class_name in enumerate(class_names):
+        class_dir = os.path.join(split_dir, class_name)
+        for name in sorted(os.listdir(class_dir)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(class_dir, name))
+                labels.append(label)
+    return paths, labels, class_names
+
+
+def decode_image(path, target):
+    image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+    image = tf.image.resize(image, (IMG_HEIGHT, IMG_WIDTH))
+    # Cached as uint8: a quarter of the disk footprint of float32
+    return tf.cast(tf.round(image), tf.uint8), target
+
+
+def build_augmenter():
+    # Mirrors the ImageDataGenerator settings (no shear layer exists; zoom/translation cover most of it)
+    return Sequential([
+        tf.keras.layers.RandomRotation(30 / 360, fill_mode="nearest"),
+        tf.keras.layers.RandomTranslation(0.3, 0.3, fill_mode="nearest"),
+        tf.keras.layers.RandomZoom(0.3, fill_mode="nearest"),
+        tf.keras.layers.RandomFlip("horizontal"),
+    ])
+
+
+def build_dataset(split, training=False, batch_size=BATCH_SIZE):
+    paths, labels, class_names = list_split(split)
+    targets = np.eye(len(class_names), dtype=np.float32)[labels]
+    return build_image_dataset(paths, targets, split, training, batch_size), len(paths)
+
+
+def build_image_dataset(paths, targets, cache_name, training=False, batch_size=BATCH_SIZE):
+    # The cache file name fingerprints the file list, so adding images invalidates it
+    fingerprint = hashlib.sha1("\n".join(paths).encode() + f"{IMG_WIDTH}x{IMG_HEIGHT}".encode()).hexdigest()[:12]
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    cache_path = os.path.join(CACHE_DIR, f"{cache_name}_{fingerprint}")
+
+    dataset = tf.data.Dataset.from_tensor_slices((paths, targets))
+    dataset = dataset.map(decode_image, num_parallel_calls=AUTOTUNE)
+    dataset = dataset.cache(cache_path)
+    if training:
+        dataset = dataset.shuffle(min(len(paths), 10000), reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+
+    rescale = lambda images: tf.cast(images, tf.float32) / 255.0
+    if training:
+        augmenter = build_augmenter()
+        dataset = dataset.map(lambda x, y: (augmenter(rescale(x), training=True), y), num_parallel_calls=AUTOTUNE)
+    else:
+        dataset = dataset.map(lambda x, y: (rescale(x), y), num_parallel_calls=AUTOTUNE)
+    return dataset.prefetch(AUTOTUNE)
+
+
+def build_datasets():
+    train_dataset, train_count = build_dataset("train", training=True)
+    val_dataset, _ = build_dataset("validation")
+    test_dataset, _ = build_dataset("test")
+    return train_dataset, val_dataset, test_dataset, train_count
+
+
+def list_multitask_split(split, roots):
+    # Eye-state, yawn and drowsiness folders in one list: each image is labelled only for the
+    # heads its class says something about (-1 elsewhere, masked out of the loss)
+    paths, targets = [], []
+    for root in roots:
+        root_paths, labels, class_names = list_split(split, root)
+        rows = [head_labels(name) for name in class_names]
+        paths += root_paths
+        targets += [rows[label] for label in labels]
+    return paths, np.array(targets, dtype=np.float32).reshape(-1, len(HEADS))
+
+
+def build_multitask_dataset(split, roots, training=False, batch_size=BATCH_SIZE):
+    paths, targets = list_multitask_split(split, roots)
+    return build_image_dataset(paths, targets, f"multitask_{split}", training, batch_size), len(paths)
+
+
+def build_multitask_datasets(roots):
+    train_dataset, train_count = build_multitask_dataset("train", roots, training=True)
+    val_dataset, _ = build_multitask_dataset("validation", roots)
+    test_dataset, _ = build_multitask_dataset("test", roots)
+    return train_dataset, val_dataset, test_dataset, train_count
+
+
+class ThroughputCallback(Callback):
+    def __init__(self, images_per_epoch):
+        super().__init__()
+        self.images_per_epoch = images_per_epoch
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch_start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        elapsed = time.perf_counter() - self.epoch_start
+        print(f"⏱️ Epoch {epoch + 1}: {elapsed:.1f}s, {self.images_per_epoch / elapsed:.1f} images/sec")
+
+
+def build_model():
+    # Base model
+    base_model = MobileNetV2(weights="imagenet", include_top=False, input_shape=(IMG_WIDTH, IMG_HEIGHT, 3))
+    base_model.trainable = False  # Transfer learning
+
+    # Build model
+    model = Sequential([
+        base_model,
+        GlobalAveragePooling2D(),
+        Dense(128, activation="relu"),
+        Dropout(0.5),
+        Dense(4, activation="softmax")  # 4 classes
+    ])
+
+    # Compile
+    model.compile(
+        optimizer=Adam(learning_rate=0.001),
+        loss="categorical_crossentropy",
+        metrics=["accuracy"]
+    )
+    return model
+
+
+def masked_binary_crossentropy(y_true, y_pred):
+    # Mean over the heads that are labelled for each image
+    mask = tf.cast(y_true >= 0, tf.float32)
+    loss = tf.keras.backend.binary_crossentropy(tf.maximum(y_true, 0.0), y_pred)
+    return tf.reduce_sum(loss * mask, axis=-1) / tf.maximum(tf.reduce_sum(mask, axis=-1), 1.0)
+
+
+def head_accuracy(index, head):
+    def accuracy(y_true, y_pred):
+        labelled = y_true[:, index] >= 0
+        correct = tf.cast(tf.equal(y_true[:, index], tf.round(y_pred[:, index])), tf.float32)
+        return tf.reduce_sum(tf.where(labelled, correct, 0.0)) / tf.maximum(tf.reduce_sum(tf.cast(labelled, tf.float32)), 1.0)
+    accuracy.__name__ = f"{head}_accuracy"
+    return accuracy
+
+
+def build_multitask_model():
+    # One MobileNetV2 pass shared by every head. The heads are concatenated into a single
+    # (batch, len(HEADS)) sigmoid output, so the inference backends, TFLite/ONNX export and
+    # micro-batching treat it like the 4-class model.
+    base_model = MobileNetV2(weights="imagenet", include_top=False, input_shape=(IMG_WIDTH, IMG_HEIGHT, 3))
+    base_model.trainable = False  # Transfer learning
+
+    inputs = Input(shape=(IMG_WIDTH, IMG_HEIGHT, 3))
+    features = GlobalAveragePooling2D()(base_model(inputs, training=False))
+    heads = []
+    for head in HEADS:
+        x = Dense(64, activation="relu", name=f"{head}_dense")(features)
+        x = Dropout(0.5)(x)
+        heads.append(Dense(1, activation="sigmoid", name=head)(x))
+    model = Model(inputs, Concatenate(name="heads")(heads))
+
+    model.compile(
+        optimizer=Adam(learning_rate=0.001),
+        loss=masked_binary_crossentropy,
+        metrics=[head_accuracy(i, head) for i, head in enumerate(HEADS)]
+    )
+    return model
+
+
+def train():
+    if USE_TF_DATA:
+        train_generator, val_generator, test_generator, train_count = build_datasets()
+    else:
+        train_generator, val_generator, test_generator = build_generators()
+        train_count = train_generator.samples
+    model = build_model()
+
+    # Callbacks
+    lr_scheduler = ReduceLROnPlateau(monitor="val_loss", factor=0.5, patience=3, verbose=1)
+    early_stopping = EarlyStopping(monitor="val_loss", patience=5, restore_best_weights=True)
+    throughput = ThroughputCallback(train_count)
+
+    # Train
+    history = model.fit(
+        train_generator,
+        epochs=EPOCHS,
+        validation_data=val_generator,
+        callbacks=[lr_scheduler, early_stopping, throughput]
+    )
+
+    # Evaluate
+    test_loss, test_acc = model.evaluate(test_generator)
+    print(f"✅ Test Accuracy: {test_acc:.4f}")
+
+
+    # model.save("drowsiness_model_4class.h5")
+    # print("✅ Model saved at: drowsiness_model_4class.h5")
+
+
+
+    model_path = "drowsiness_model_4class.h5"
+    model.save(model_path)
+    print(f"✅ Model saved at: {model_path}")
+
+    # Fast-loading copy picked up by `detection.py --fast-start`
+    from inference import export_tflite
+    export_tflite(model_path)
+
+
+    try:
+        files.download(model_path)
+        print("✅ Model downloaded to your PC.")
+    except Exception as e:
+        print(f"❌ Error downloading: {e}")
+        print("Try saving to Google Drive or using another method.")
+
+    return model, history
+
+
+def train_multitask(roots=(DATASET_PATH, YAWN_DATASET_PATH)):
+    train_dataset, val_dataset, test_dataset, train_count = build_multitask_datasets(roots)
+    model = build_multitask_model()
+
+    lr_scheduler = ReduceLROnPlateau(monitor="val_loss", factor=0.5, patience=3, verbose=1)
+    early_stopping = EarlyStopping(monitor="val_loss", patience=5, restore_best_weights=True)
+    throughput = ThroughputCallback(train_count)
+
+    history = model.fit(
+        train_dataset,
+        epochs=EPOCHS,
+        validation_data=val_dataset,
+        callbacks=[lr_scheduler, early_stopping, throughput]
+    )
+
+    results = model.evaluate(test_dataset, return_dict=True)
+    for head in HEADS:
+        print(f"✅ Test {head} accuracy: {results[f'{head}_accuracy']:.4f}")
+
+    model_path = "drowsiness_model_multitask.h5"
+    model.save(model_path)
+    print(f"✅ Model saved at: {model_path}")
+
+    from inference import export_tflite
+    export_tflite(model_path)
+    return model, history
+
+
+if __name__ == "__main__":
+    import argparse
 
-# Data augmentation
-train_datagen = ImageDataGenerator(
-    rescale=1./255,
-    rotation_range=30,
-    width_shift_range=0.3,
-    height_shift_range=0.3,
-    shear_range=0.2,
-    zoom_range=0.3,
-    horizontal_flip=True,
-    fill_mode="nearest"
-)
-
-test_datagen = ImageDataGenerator(rescale=1./255)
-
-# Train generator
-train_generator = train_datagen.flow_from_directory(
-    os.path.join(DATASET_PATH, "train"),
-    target_size=(IMG_WIDTH, IMG_HEIGHT),
-    batch_size=BATCH_SIZE,
-    class_mode="categorical",
-    color_mode="rgb"  # force 3-channel
-)
-
-# Validation generator
-val_generator = test_datagen.flow_from_directory(
-    os.path.join(DATASET_PATH, "validation"),
-    target_size=(IMG_WIDTH, IMG_HEIGHT),
-    batch_size=BATCH_SIZE,
-    class_mode="categorical",
-    color_mode="rgb"
-)
-
-# Test generator
-test_generator = test_datagen.flow_from_directory(
-    os.path.join(DATASET_PATH, "test"),
-    target_size=(IMG_WIDTH, IMG_HEIGHT),
-    batch_size=BATCH_SIZE,
-    class_mode="categorical",
-    color_mode="rgb"
-)
-
-# Base model
-base_model = MobileNetV2(weights="imagenet", include_top=False, input_shape=(IMG_WIDTH, IMG_HEIGHT, 3))
-base_model.trainable = False  # Transfer learning
-
-# Build model
-model = Sequential([
-    base_model,
-    GlobalAveragePooling2D(),
-    Dense(128, activation="relu"),
-    Dropout(0.5),
-    Dense(4, activation="softmax")  # 4 classes
-])
-
-# Compile
-model.compile(
-    optimizer=Adam(learning_rate=0.001),
-    loss="categorical_crossentropy",
-    metrics=["accuracy"]
-)
-
-# Callbacks
-lr_scheduler = ReduceLROnPlateau(monitor="val_loss", factor=0.5, patience=3, verbose=1)
-early_stopping = EarlyStopping(monitor="val_loss", patience=5, restore_best_weights=True)
-
-# Train
-history = model.fit(
-    train_generator,
-    epochs=EPOCHS,
-    validation_data=val_generator,
-    callbacks=[lr_scheduler, early_stopping]
-)
-
-# Evaluate
-test_loss, test_acc = model.evaluate(test_generator)
-print(f"✅ Test Accuracy: {test_acc:.4f}")
-
-
-# model.save("drowsiness_model_4class.h5")
-# print("✅ Model saved at: drowsiness_model_4class.h5")
-
-
-
-model_path = "drowsiness_model_4class.h5"
-model.save(model_path)
-print(f"✅ Model saved at: {model_path}")
-
-
-try:
-    files.download(model_path)
-    print("✅ Model downloaded to your PC.")
-except Exception as e:
-    print(f"❌ Error downloading: {e}")
-    print("Try saving to Google Drive or using another method.")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the drowsiness model")
+    parser.add_argument("--multitask", action="store_true",
+                        help="Train the shared-backbone eye-state / yawn / drowsy model instead of the 4-class one")
+    parser.add_argument("--dataset", action="append",
+                        help="Dataset root with train/validation/test splits (multi-task, repeatable)")
+    args = parser.parse_args()
+    if args.multitask:
+        train_multitask(args.dataset or (DATASET_PATH, YAWN_DATASET_PATH))
+    else:
+        train()
@@ -0,0 +1,258 @@
+import argparse
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from camera import CAMERA_BUFFER, CAMERA_FOURCC, CAMERA_FPS, CAMERA_SIZE, Camera, parse_size
+from detection import MODEL_PATH, DrowsinessDetector
+from frame_context import FrameContext
+from inference import BACKENDS, load_backend
+from pipeline import PipelineStats
+from roi import ROI_MODES
+
+MAX_BATCH = 8  # Upper bound on ROIs per model call
+BATCH_DEADLINE_MS = 15  # Longest a ROI waits for the batch to fill
+REPORT_INTERVAL = 5.0  # Seconds between per-stream FPS reports
+
+
+class MicroBatcher:
+    # Collects classifier inputs from every stream and runs them as one model call,
+    # either when the batch is full or when the oldest request hits its deadline.
+    def __init__(self, backend, input_size, max_batch=MAX_BATCH, deadline_ms=BATCH_DEADLINE_MS):
+        width, height = input_size
+        self.backend = backend
+        self.max_batch = max_batch
+        self.deadline = deadline_ms / 1000.0
+        self._batch = np.zeros((max_batch, height, width, 3), dtype=np.float32)
+        self._requests = deque()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self.batches = 0
+        self.items = 0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+        while self._requests:
+            self._requests.popleft()[1].set_exception(RuntimeError("Batcher stopped"))
+
+    def submit(self, input_tensor):
+        future = Future()
+        with self._cond:
+            self._requests.append((input_tensor, future))
+            self._cond.notify()
+        return future
+
+    def predict(self, input_tensor):
+        return self.submit(input_tensor).result()
+
+    def batch_size(self, count):
+        # Keras and ONNX run any batch size as is. TFLite keeps one interpreter per input shape, so
+        # its batches are padded to the next power of two: at most log2(max_batch) + 1 interpreters.
+        if self.backend.name != "tflite":
+            return count
+        return min(1 << (count - 1).bit_length(), self.max_batch)
+
+    @property
+    def mean_batch_size(self):
+        return self.items / self.batches if self.batches else 0.0
+
+    def _collect(self):
+        with self._cond:
+            while not self._requests and self._running:
+                self._cond.wait(0.5)
+            if not self._running:
+                return []
+            deadline = time.perf_counter() + self.deadline
+            while len(self._requests) < self.max_batch and self._running:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(len(self._requests), self.max_batch)
+            return [self._requests.popleft() for _ in range(count)]
+
+    def _loop(self):
+        while self._running:
+            requests = self._collect()
+            if not requests:
+                continue
+            for i, (input_tensor, _) in enumerate(requests):
+                self._batch[i] = input_tensor[0]
+            try:
+                # Padding rows (TFLite only) are leftovers from earlier batches, sliced off here
+                outputs = self.backend.predict(self._batch[:self.batch_size(len(requests))])[:len(requests)]
+            except Exception as e:
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(requests)
+            for i, (_, future) in enumerate(requests):
+                future.set_result(outputs[i])
+
+
+class StreamWorker:
+    # One camera feed: its own capture, FaceMesh and detector state (eye timers,
+    # cooldowns); only the classifier is shared through the batcher.
+    def __init__(self, index, source, backend, batcher, roi_mode="frame", cnn_every=None, cnn_hz=None,
+                 camera_options=None):
+        self.index = index
+        self.source = source
+        self.camera_options = camera_options or {}  # size / fps / fourcc / buffer_size, see camera.Camera
+        self.batcher = batcher
+        self.detector = DrowsinessDetector(backend=backend, roi_mode=roi_mode, cnn_every=cnn_every,
+                                           cnn_hz=cnn_hz, audio=False)
+        self.ctx = FrameContext(self.detector.input_size)
+        self.stats = PipelineStats()
+        self.status = "Starting"
+        self.alerts = 0
+        self.error = None
+        self.camera = None
+        self._thread = None
+
+    def start(self):
+        self.detector.running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.detector.stop()
+
+    def join(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    @property
+    def alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _loop(self):
+        # Files are read as fast as decoding allows; webcams get the explicit capture settings
+        cap = self.camera = Camera(self.source, realtime=False, **self.camera_options)
+        if not cap.isOpened():
+            self.error = f"Could not open source {self.source}"
+            print(f"❌ [stream {self.index}] {self.error}")
+            self.detector.close()
+            return
+
+        ctx = self.ctx
+        frame_id = 0
+        try:
+            while self.detector.running:
+                ret, ctx.raw = cap.read(ctx.raw)
+                if not ret:
+                    self.status = "Ended"
+                    break
+                ctx.frame = ctx.raw
+                read_at = time.time()
+                # Files decode faster than real time: eye-closure timers, PERCLOS and cooldowns run on video time
+                ctx.prepare(frame_id, read_at if cap.live else frame_id / cap.source_fps)
+                self.stats.frames_captured += 1
+                frame_id += 1
+
+                self.detector.landmark_stage(ctx)
+                self.detector.cnn_stage(ctx, self.batcher.predict)
+                self.status, _, alert = self.detector.update_status(ctx, ctx.captured_at)
+                if alert:
+                    self.alerts += 1
+                    print(f"🚨 [stream {self.index}] {self.status} on {self.source}")
+                self.stats.record(ctx, read_at)
+        except Exception as e:
+            self.error = str(e)
+            print(f"❌ [stream {self.index}] {e}")
+        finally:
+            cap.release()
+            self.detector.close()
+
+
+class MultiStreamServer:
+    def __init__(self, sources, model_path=MODEL_PATH, backend=None, roi_mode="frame", cnn_every=None,
+                 cnn_hz=None, max_batch=MAX_BATCH, deadline_ms=BATCH_DEADLINE_MS, camera_options=None):
+        # One model instance in memory, however many feeds are monitored
+        self.backend = load_backend(model_path, backend)
+        self.batcher = MicroBatcher(self.backend, self.backend.input_size,
+                                    min(max_batch, len(sources)), deadline_ms)
+        self.workers = [
+            StreamWorker(i, source, self.backend, self.batcher, roi_mode, cnn_every, cnn_hz, camera_options)
+            for i, source in enumerate(sources)
+        ]
+        self.started_at = None
+
+    def report(self):
+        elapsed = time.time() - self.started_at if self.started_at else 0.0
+        total = sum(w.stats.frames_processed for w in self.workers)
+        lines = [f"📊 Throughput: {total / elapsed if elapsed else 0.0:.1f} frames/s across {len(self.workers)} streams | "
+                 f"Mean batch: {self.batcher.mean_batch_size:.2f}"]
+        for w in self.workers:
+            p50, _ = w.stats.latency_ms()
+            camera = f" | camera {w.camera.delivered_fps:.1f} FPS, {w.camera.stalls} stalls" if w.camera else ""
+            lines.append(f"   [stream {w.index}] {w.source}: {w.stats.fps:.1f} FPS | latency p50 {p50:.0f} ms | "
+                         f"status: {w.status} | alerts: {w.alerts}{camera}")
+        return "\n".join(lines)
+
+    def run(self):
+        self.started_at = time.time()
+        self.batcher.start()
+        for w in self.workers:
+            w.start()
+        last_report = time.time()
+        try:
+            while any(w.alive for w in self.workers):
+                time.sleep(0.2)
+                if time.time() - last_report >= REPORT_INTERVAL:
+                    last_report = time.time()
+                    print(self.report())
+        except KeyboardInterrupt:
+            print("🛑 Stopping streams...")
+        finally:
+            self.stop()
+            print(self.report())
+
+    def stop(self):
+        for w in self.workers:
+            w.stop()
+        for w in self.workers:
+            w.join(timeout=2.0)
+        self.batcher.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drowsiness detection across many camera feeds with batched inference")
+    parser.add_argument("sources", nargs="+", help="Webcam indices, video files, stream URLs or image directories")
+    parser.add_argument("--model", default=MODEL_PATH, help="Model file (.h5, .tflite or .onnx)")
+    parser.add_argument("--backend", choices=BACKENDS, help="Inference backend (default: inferred from the model file)")
+    parser.add_argument("--roi", choices=ROI_MODES, default="frame")
+    parser.add_argument("--cnn-every", type=int, help="Adaptive CNN cadence per stream, in frames")
+    parser.add_argument("--cnn-hz", type=float, help="Adaptive CNN cadence per stream, in Hz")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--deadline-ms", type=float, default=BATCH_DEADLINE_MS,
+                        help="Longest a frame waits for the batch to fill")
+    parser.add_argument("--camera-size", type=parse_size, default=CAMERA_SIZE, metavar="WxH",
+                        help="Capture resolution requested from each webcam (default: %(default)s)")
+    parser.add_argument("--camera-fps", type=float, default=CAMERA_FPS, help="Capture frame rate requested from each webcam")
+    parser.add_argument("--camera-fourcc", default=CAMERA_FOURCC, help="Capture pixel format, e.g. MJPG or YUYV")
+    parser.add_argument("--camera-buffer", type=int, default=CAMERA_BUFFER, help="Frames queued in the webcam driver")
+    args = parser.parse_args()
+
+    camera_options = {"size": args.camera_size, "fps": args.camera_fps, "fourcc": args.camera_fourcc,
+                      "buffer_size": args.camera_buffer}
+    server = MultiStreamServer(args.sources, args.model, args.backend, args.roi, args.cnn_every, args.cnn_hz,
+                               args.max_batch, args.deadline_ms, camera_options)
+    server.run()
+
+
+if __name__ == "__main__":
+    main()
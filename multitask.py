@@ -0,0 +1,48 @@
+import numpy as np
+
+# Model outputs, by width:
+#   4 -> the original 4-class softmax (model.py build_model); classes 1 and 2 mean drowsy
+#   3 -> the multi-task model (model.py build_multitask_model): one sigmoid per head, from a
+#        single shared-backbone pass
+LEGACY_NUM_CLASSES = 4
+LEGACY_DROWSY_CLASSES = [1, 2]
+HEADS = ("eyes_closed", "yawn", "drowsy")
+DEFAULT_HEAD_THRESHOLDS = {"eyes_closed": 0.5, "yawn": 0.5, "drowsy": 0.7}
+
+# Multi-task training labels per dataset class folder (lower-cased). Heads a class says nothing
+# about are left out and masked from the loss, so eye, yawn and drowsiness datasets can be mixed.
+CLASS_HEAD_LABELS = {
+    "closed": {"eyes_closed": 1, "drowsy": 1},
+    "open": {"eyes_closed": 0, "drowsy": 0},
+    "yawn": {"yawn": 1, "drowsy": 1},
+    "no_yawn": {"yawn": 0, "drowsy": 0},
+    "drowsy": {"drowsy": 1},
+    "non_drowsy": {"drowsy": 0},
+    "non drowsy": {"drowsy": 0},
+}
+
+
+def is_multitask(prediction):
+    return np.shape(prediction)[-1] == len(HEADS)
+
+
+def drowsy_scores(probs):
+    # Drowsiness probability for (..., outputs) predictions of either model kind
+    probs = np.asarray(probs)
+    if is_multitask(probs):
+        return probs[..., HEADS.index("drowsy")]
+    return probs[..., LEGACY_DROWSY_CLASSES].sum(axis=-1)
+
+
+def head_probabilities(prediction):
+    if not is_multitask(prediction):
+        return {"drowsy": float(drowsy_scores(prediction))}
+    return {head: float(p) for head, p in zip(HEADS, prediction)}
+
+
+def head_labels(class_name):
+    # Training target row for one class folder: 1/0 per head, -1 where the class carries no label
+    labels = CLASS_HEAD_LABELS.get(class_name.lower())
+    if labels is None:
+        raise ValueError(f"No head labels for class '{class_name}'. Add it to multitask.CLASS_HEAD_LABELS")
+    return [labels.get(head, -1) for head in HEADS]
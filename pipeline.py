@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import deque
+
+from frame_context import FramePool
+
+# Queue sizes between stages. Keeping them tiny means a slow stage sees the
+# freshest frame instead of working through a backlog of stale ones.
+CAPTURE_QUEUE_SIZE = 1
+STAGE_QUEUE_SIZE = 1
+STATS_WINDOW = 120  # Frames kept for rolling FPS / latency figures
+STATS_PRINT_INTERVAL = 5.0  # Seconds between console reports
+
+
+class DropOldestQueue:
+    def __init__(self, maxsize=1, on_drop=None):
+        self.maxsize = maxsize
+        self.on_drop = on_drop
+        self.dropped = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, item):
+        dropped_item = None
+        with self._cond:
+            if self._closed:
+                dropped_item = item
+            else:
+                if len(self._items) >= self.maxsize:
+                    dropped_item = self._items.popleft()
+                    self.dropped += 1
+                self._items.append(item)
+                self._cond.notify()
+        if dropped_item is not None and self.on_drop:
+            self.on_drop(dropped_item)
+
+    def get(self, timeout=None):
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class PipelineStats:
+    def __init__(self, window=STATS_WINDOW):
+        self.frames_captured = 0
+        self.frames_processed = 0
+        self._latencies = deque(maxlen=window)
+        self._completed_at = deque(maxlen=window)
+        self._last_print = time.time()
+
+    def record(self, ctx, read_at=None):
+        # read_at: wall-clock read time when ctx.captured_at is video time (unpaced file sources)
+        now = time.time()
+        ctx.latency = now - (ctx.captured_at if read_at is None else read_at)
+        self.frames_processed += 1
+        self._latencies.append(ctx.latency)
+        self._completed_at.append(now)
+
+    @property
+    def fps(self):
+        if len(self._completed_at) < 2:
+            return 0.0
+        elapsed = self._completed_at[-1] - self._completed_at[0]
+        return (len(self._completed_at) - 1) / elapsed if elapsed > 0 else 0.0
+
+    def latency_ms(self):
+        if not self._latencies:
+            return 0.0, 0.0
+        ordered = sorted(self._latencies)
+        return ordered[len(ordered) // 2] * 1000, ordered[-1] * 1000
+
+    def summary(self, dropped):
+        p50, worst = self.latency_ms()
+        return (f"📊 FPS: {self.fps:.1f} | Captured: {self.frames_captured} | Processed: {self.frames_processed} | "
+                f"Dropped: {dropped} | Latency p50: {p50:.0f} ms, max: {worst:.0f} ms")
+
+    def maybe_print(self, dropped):
+        now = time.time()
+        if now - self._last_print >= STATS_PRINT_INTERVAL:
+            self._last_print = now
+            print(self.summary(dropped))
+
+
+class FramePipeline:
+    # Capture thread -> stage threads -> output queue drained by the caller
+    # (the render/alert stage stays on the main thread because of cv2.imshow).
+    # Frame contexts come from a fixed pool; dropped frames and rendered frames go back to it.
+    def __init__(self, read_frame, stages, input_size, capture_queue_size=CAPTURE_QUEUE_SIZE,
+                 stage_queue_size=STAGE_QUEUE_SIZE):
+        self.read_frame = read_frame
+        self.stages = stages
+        self.stats = PipelineStats()
+        # Queued + one in each stage + one being captured + one being rendered
+        pool_size = capture_queue_size + len(stages) * (stage_queue_size + 1) + 2
+        self.pool = FramePool(input_size, pool_size)
+        self.queues = [DropOldestQueue(capture_queue_size, self.pool.release)]
+        self.queues += [DropOldestQueue(stage_queue_size, self.pool.release) for _ in stages]
+        self._threads = []
+        self._running = False
+        self.error = None
+
+    @property
+    def dropped(self):
+        return sum(q.dropped for q in self.queues)
+
+    @property
+    def alive(self):
+        return self._running and all(t.is_alive() for t in self._threads)
+
+    def start(self):
+        self._running = True
+        self._threads = [threading.Thread(target=self._capture_loop, daemon=True)]
+        for i, stage in enumerate(self.stages):
+            self._threads.append(threading.Thread(
+                target=self._stage_loop, args=(stage, self.queues[i], self.queues[i + 1]), daemon=True
+            ))
+        for t in self._threads:
+            t.start()
+
+    def get(self, timeout=None):
+        return self.queues[-1].get(timeout)
+
+    def release(self, ctx):
+        self.pool.release(ctx)
+
+    def stop(self):
+        self._running = False
+        for q in self.queues:
+            q.close()
+        for t in self._threads:
+            t.join(timeout=2.0)
+
+    def _capture_loop(self):
+        frame_id = 0
+        while self._running:
+            ctx = self.pool.acquire()
+            if not self.read_frame(ctx):
+                self.pool.release(ctx)
+                self.error = "Could not read frame."
+                break
+            ctx.prepare(frame_id, time.time())
+            self.stats.frames_captured += 1
+            self.queues[0].put(ctx)
+            frame_id += 1
+        self._running = False
+        for q in self.queues:
+            q.close()
+
+    def _stage_loop(self, stage, inbox, outbox):
+        while self._running or not inbox.closed:
+            ctx = inbox.get(timeout=0.5)
+            if ctx is None:
+                if inbox.closed:
+                    break
+                continue
+            try:
+                stage(ctx)
+            except Exception as e:
+                self.error = f"Stage {getattr(stage, '__name__', stage)} failed: {e}"
+                self._running = False
+                for q in self.queues:
+                    q.close()
+                break
+            outbox.put(ctx)
@@ -0,0 +1,167 @@
+import os
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+# Annotated, downscaled frames shared with the dashboard through a shared-memory ring.
+# No pickling or pipes: the detector resizes straight into the segment and readers map it.
+PREVIEW_NAME = "drowziguard_preview"
+PREVIEW_HZ = 10  # Frames published per second, whatever the detection rate
+PREVIEW_WIDTH = 480
+SLOTS = 3  # Writer fills the slot after the latest one, so a reader has two frame periods to copy
+HEADER = 8  # int64 fields
+CLOSED, SEQ, NUM_SLOTS, HEIGHT, WIDTH = range(5)
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name)
+        if os.name == "posix":
+            # Older Pythons track attached segments too and unlink them when the reader exits
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class FrameRing:
+    # Single writer, any number of readers. Layout: header | per-slot sequence numbers |
+    # per-slot timestamps | slots x (height, width, 3) uint8 frames.
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((HEADER,), np.int64, shm.buf)
+        slots, height, width = (int(v) for v in self.header[[NUM_SLOTS, HEIGHT, WIDTH]])
+        self.slot_seqs = np.ndarray((slots,), np.int64, shm.buf, offset=HEADER * 8)
+        self.slot_times = np.ndarray((slots,), np.float64, shm.buf, offset=(HEADER + slots) * 8)
+        self.frames = np.ndarray((slots, height, width, 3), np.uint8, shm.buf, offset=(HEADER + 2 * slots) * 8)
+
+    @classmethod
+    def create(cls, height, width, slots=SLOTS, name=PREVIEW_NAME):
+        try:
+            stale = _attach(name)  # Left behind by a writer that crashed
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        shm = shared_memory.SharedMemory(name, create=True, size=(HEADER + 2 * slots) * 8 + slots * height * width * 3)
+        header = np.ndarray((HEADER,), np.int64, shm.buf)
+        header[:] = 0
+        header[[NUM_SLOTS, HEIGHT, WIDTH]] = slots, height, width
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name=PREVIEW_NAME):
+        try:
+            return cls(_attach(name), owner=False)
+        except FileNotFoundError:
+            return None
+
+    @property
+    def shape(self):
+        return self.frames.shape[1:3]
+
+    @property
+    def closed(self):
+        return self.shm is None or bool(self.header[CLOSED])
+
+    def publish(self, frame, annotate=None):
+        seq = int(self.header[SEQ]) + 1
+        slot = seq % len(self.frames)
+        self.slot_seqs[slot] = -1  # Being written
+        target = self.frames[slot]
+        height, width = self.shape
+        cv2.resize(frame, (width, height), dst=target, interpolation=cv2.INTER_AREA)
+        if annotate:
+            annotate(target)
+        self.slot_times[slot] = time.time()
+        self.slot_seqs[slot] = seq
+        self.header[SEQ] = seq
+        return seq
+
+    def read(self, last_seq=None):
+        # Returns (seq, timestamp, frame copy), or None when there's nothing new
+        seq = int(self.header[SEQ])
+        if seq == 0 or seq == last_seq:
+            return None
+        slot = seq % len(self.frames)
+        frame = self.frames[slot].copy()
+        timestamp = float(self.slot_times[slot])
+        if self.slot_seqs[slot] != seq:
+            return None  # Lapped by the writer while copying
+        return seq, timestamp, frame
+
+    def close(self):
+        if self.shm is None:
+            return
+        if self.owner:
+            self.header[CLOSED] = 1  # Tells readers to re-attach to the next segment
+        # Views into the buffer must go before the segment can be closed
+        self.header = self.slot_seqs = self.slot_times = self.frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+        self.shm = None
+
+
+class PreviewPublisher:
+    # Throttles publishing and sizes the ring from the first frame (and again if the camera changes)
+    def __init__(self, hz=PREVIEW_HZ, width=PREVIEW_WIDTH, name=PREVIEW_NAME):
+        self.interval = 1.0 / hz
+        self.width = width
+        self.name = name
+        self.ring = None
+        self.published = 0
+        self._last = 0.0
+
+    def due(self):
+        return time.perf_counter() - self._last >= self.interval
+
+    def publish(self, frame, annotate=None):
+        h, w = frame.shape[:2]
+        width = min(w, self.width)
+        height = round(h * width / w)
+        if self.ring is None or self.ring.shape != (height, width):
+            self.close()
+            self.ring = FrameRing.create(height, width, name=self.name)
+        self.ring.publish(frame, annotate)
+        self._last = time.perf_counter()
+        self.published += 1
+
+    def close(self):
+        if self.ring:
+            self.ring.close()
+            self.ring = None
+
+
+class PreviewReader:
+    # Dashboard side: follows the writer across restarts and resolution changes
+    def __init__(self, name=PREVIEW_NAME):
+        self.name = name
+        self.ring = None
+        self.last_seq = None
+        self.last_frame = None
+        self.last_timestamp = None
+
+    def latest(self):
+        # Newest frame (BGR), or the previous one when nothing new arrived; None before the first frame
+        if self.ring is None or self.ring.closed:
+            if self.ring:
+                self.ring.close()
+            self.ring = FrameRing.attach(self.name)
+            self.last_seq = None
+            if self.ring is None:
+                return None
+        result = self.ring.read(self.last_seq)
+        if result:
+            self.last_seq, self.last_timestamp, self.last_frame = result
+        return self.last_frame
+
+    def close(self):
+        if self.ring:
+            self.ring.close()
+            self.ring = None
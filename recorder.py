@@ -0,0 +1,187 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from multitask import LEGACY_NUM_CLASSES
+from pipeline import DropOldestQueue
+
+EVENTS_DIR = "Events"
+PRE_SECONDS = 10.0  # Footage kept from before the alert
+POST_SECONDS = 5.0  # ...and recorded after it (extended when alerts keep coming)
+MAX_EVENT_SECONDS = 60.0  # Cap on post-trigger footage of one merged event
+RECORD_FPS = 10  # Frames kept per second, whatever the camera rate
+RECORD_WIDTH = 320
+JPEG_QUALITY = 75
+SLOT_BYTES = 48 * 1024  # JPEG budget per slot; a 320x240 frame at quality 75 is typically 10-25 KB
+STAGING_FRAMES = 4  # Downscaled frames waiting for the encoder
+
+
+class JpegRing:
+    # Fixed-memory ring of JPEG frames plus their trace, allocated once up front
+    def __init__(self, slots, num_outputs, slot_bytes=SLOT_BYTES):
+        self.slot_bytes = slot_bytes
+        self.data = np.zeros((slots, slot_bytes), dtype=np.uint8)
+        self.sizes = np.zeros(slots, dtype=np.int32)
+        self.frame_ids = np.zeros(slots, dtype=np.int64)
+        self.timestamps = np.zeros(slots, dtype=np.float64)
+        self.ears = np.zeros(slots, dtype=np.float32)
+        self.probs = np.zeros((slots, num_outputs), dtype=np.float32)
+        self.statuses = [""] * slots
+        self.head = 0
+        self.count = 0
+        self.oversized = 0
+
+    def push(self, jpeg, frame_id, timestamp, ear, probs, status):
+        if jpeg.size > self.slot_bytes:
+            self.oversized += 1
+            return
+        i = self.head
+        self.data[i, :jpeg.size] = jpeg
+        self.sizes[i] = jpeg.size
+        self.frame_ids[i] = frame_id
+        self.timestamps[i] = timestamp
+        self.ears[i] = ear
+        self.probs[i] = probs
+        self.statuses[i] = status
+        self.head = (i + 1) % len(self.sizes)
+        self.count = min(self.count + 1, len(self.sizes))
+
+    def snapshot(self):
+        # Oldest to newest, copied out so the ring can keep going
+        order = [(self.head - self.count + k) % len(self.sizes) for k in range(self.count)]
+        return [(self.data[i, :self.sizes[i]].tobytes(), self.frame_ids[i], self.timestamps[i], self.ears[i],
+                 self.probs[i].copy(), self.statuses[i]) for i in order]
+
+
+class EventRecorder:
+    # The detection loop only downscales a frame into a staging buffer (at RECORD_FPS) and hands
+    # it over without waiting. JPEG encoding runs on the recorder thread, clip and trace writing
+    # on a separate writer thread.
+    def __init__(self, output_dir=EVENTS_DIR, pre_seconds=PRE_SECONDS, post_seconds=POST_SECONDS,
+                 fps=RECORD_FPS, width=RECORD_WIDTH, quality=JPEG_QUALITY, num_outputs=LEGACY_NUM_CLASSES):
+        self.output_dir = output_dir
+        self.post_seconds = post_seconds
+        self.fps = fps
+        self.width = width
+        self.quality = quality
+        self.num_outputs = num_outputs  # Model output width (backend.output_size)
+        self.ring = JpegRing(max(1, int(pre_seconds * fps)), num_outputs)
+        self._free = deque()
+        self._queue = DropOldestQueue(STAGING_FRAMES, on_drop=lambda item: self._free.append(item[0]))
+        self._triggers = deque()
+        self._event = None
+        self._last_frame_time = 0.0
+        self._writer = ThreadPoolExecutor(1)
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        self.events = 0
+
+    def add(self, ctx, status):
+        # Detection thread: cheap and non-blocking
+        if ctx.captured_at - self._last_frame_time < 1.0 / self.fps:
+            return
+        self._last_frame_time = ctx.captured_at
+        h, w = ctx.frame.shape[:2]
+        size = (min(w, self.width), round(h * min(w, self.width) / w))
+        # Staging buffers circulate between here, the queue and the encoder; only a handful ever exist
+        buffer = self._free.popleft() if self._free else None
+        if buffer is None or buffer.shape[:2] != (size[1], size[0]):
+            buffer = np.empty((size[1], size[0], 3), np.uint8)
+        cv2.resize(ctx.frame, size, dst=buffer, interpolation=cv2.INTER_AREA)
+        probs = ctx.probs if ctx.probs is not None else np.full(self.num_outputs, np.nan, dtype=np.float32)
+        ear = np.nan if ctx.ear is None else ctx.ear
+        self._queue.put((buffer, ctx.frame_id, ctx.captured_at, ear, np.array(probs, dtype=np.float32), status))
+
+    def trigger(self, reason, captured_at):
+        self._triggers.append((reason, captured_at))
+
+    def _loop(self):
+        while True:
+            item = self._queue.get(timeout=0.2)
+            if item is None:
+                if self._queue.closed:
+                    break
+                continue
+            buffer, frame_id, timestamp, ear, probs, status = item
+            ok, jpeg = cv2.imencode(".jpg", buffer, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            self._free.append(buffer)
+            if not ok:
+                continue
+            record = (jpeg.tobytes(), frame_id, timestamp, ear, probs, status)
+            while self._triggers:
+                self._start_or_extend(*self._triggers.popleft())
+            if self._event:
+                self._event["frames"].append(record)
+                if timestamp >= self._event["until"]:
+                    self._finish_event()
+            self.ring.push(jpeg.ravel(), frame_id, timestamp, ear, probs, status)
+        if self._event:
+            self._finish_event()  # Shutting down mid-event: keep what we have
+
+    def _start_or_extend(self, reason, captured_at):
+        if self._event:
+            until = min(captured_at + self.post_seconds, self._event["started"] + MAX_EVENT_SECONDS)
+            self._event["until"] = max(self._event["until"], until)
+            self._event["reasons"].append(reason)
+            return
+        self._event = {"started": captured_at, "until": captured_at + self.post_seconds, "reasons": [reason],
+                       "frames": self.ring.snapshot()}
+
+    def _finish_event(self):
+        event, self._event = self._event, None
+        self.events += 1
+        self._writer.submit(self._write_event, event)
+
+    def _write_event(self, event):
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(event["started"]))
+        reason = "".join(c if c.isalnum() else "_" for c in event["reasons"][0].lower()).strip("_")
+        event_dir = os.path.join(self.output_dir, f"{stamp}_{reason}")
+        os.makedirs(event_dir, exist_ok=True)
+        frames = event["frames"]
+
+        # Decoded one at a time so a long event never holds every frame in memory
+        clip_path = os.path.join(event_dir, "clip.mp4")
+        first = cv2.imdecode(np.frombuffer(frames[0][0], np.uint8), cv2.IMREAD_COLOR)
+        h, w = first.shape[:2]
+        writer = cv2.VideoWriter(clip_path, cv2.VideoWriter_fourcc(*"mp4v"), self.fps, (w, h))
+        if writer.isOpened():
+            for jpeg, *_ in frames:
+                image = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+                if image.shape[:2] == (h, w):
+                    writer.write(image)
+            writer.release()
+        else:
+            # No MP4 encoder in this OpenCV build: back-to-back JPEGs (play with: ffplay -f mjpeg)
+            clip_path = os.path.join(event_dir, "clip.mjpeg")
+            with open(clip_path, "wb") as f:
+                for jpeg, *_ in frames:
+                    f.write(jpeg)
+
+        np.savez_compressed(
+            os.path.join(event_dir, "trace.npz"),
+            frame=np.array([f[1] for f in frames], dtype=np.int64),
+            timestamp=np.array([f[2] for f in frames], dtype=np.float64),
+            ear=np.array([f[3] for f in frames], dtype=np.float32),
+            probs=np.array([f[4] for f in frames], dtype=np.float32).reshape(-1, self.num_outputs),
+            status=np.array([f[5] for f in frames]),
+        )
+        with open(os.path.join(event_dir, "event.json"), "w") as f:
+            json.dump({"started": event["started"], "reasons": event["reasons"], "frames": len(frames),
+                       "pre_trigger_frames": sum(1 for f in frames if f[2] < event["started"]),
+                       "clip": os.path.basename(clip_path)}, f, indent=2)
+        print(f"🎬 Event saved at: {event_dir}")
+
+    def summary(self):
+        # Skipped: frames the encoder couldn't keep up with (never the detection loop waiting)
+        return f"🎬 {self.events} event(s) recorded to {self.output_dir}, {self._queue.dropped} frames skipped"
+
+    def close(self):
+        self._queue.close()
+        self._thread.join(timeout=5.0)
+        self._writer.shutdown(wait=True)
@@ -0,0 +1,64 @@
+import numpy as np
+
+ROI_MODES = ("frame", "face", "eyes_mouth")
+ROI_MARGIN = 0.15  # Extra border around the landmark box, as a fraction of its size
+ROI_SMOOTHING = 0.6  # EMA weight on the previous box; damps landmark jitter between frames
+ROI_HOLD_FRAMES = 3  # Keep the last box for a few frames when FaceMesh briefly loses the face
+
+# Eyes, brows and mouth: enough context for eye-state and yawn cues without hair/background
+EYES_MOUTH_INDICES = [33, 160, 158, 133, 153, 144, 362, 385, 387, 263, 373, 380,
+                      70, 105, 300, 334, 61, 291, 13, 14, 17]
+
+
+class FaceROI:
+    def __init__(self, mode="face", margin=ROI_MARGIN, smoothing=ROI_SMOOTHING, hold_frames=ROI_HOLD_FRAMES):
+        if mode not in ROI_MODES:
+            raise ValueError(f"Unknown ROI mode '{mode}'. Choose from: {', '.join(ROI_MODES)}")
+        self.mode = mode
+        self.margin = margin
+        self.smoothing = smoothing
+        self.hold_frames = hold_frames
+        self.box = None
+        self._missed = 0
+
+    def update(self, landmarks, frame_shape):
+        # landmarks: (N, 3) pixel coordinates from ear.landmarks_to_array, or None
+        h, w = frame_shape[:2]
+        if self.mode == "frame":
+            return (0, 0, w, h)
+
+        if landmarks is None:
+            self._missed += 1
+            if self._missed > self.hold_frames:
+                self.box = None
+            return self._as_pixels(w, h)
+
+        self._missed = 0
+        points = landmarks[EYES_MOUTH_INDICES] if self.mode == "eyes_mouth" else landmarks
+        (x_min, y_min), (x_max, y_max) = points[:, :2].min(axis=0), points[:, :2].max(axis=0)
+
+        # Square box so the crop isn't distorted when resized to the model input
+        cx, cy = (x_min + x_max) / 2, (y_min + y_max) / 2
+        side = max(x_max - x_min, y_max - y_min) * (1 + 2 * self.margin)
+        box = np.array([cx, cy, side], dtype=np.float32)
+
+        if self.box is None:
+            self.box = box
+        else:
+            self.box = self.smoothing * self.box + (1 - self.smoothing) * box
+        return self._as_pixels(w, h)
+
+    def _as_pixels(self, w, h):
+        if self.box is None:
+            return None
+        cx, cy, side = self.box
+        half = side / 2
+        x1, y1 = max(int(cx - half), 0), max(int(cy - half), 0)
+        x2, y2 = min(int(cx + half), w), min(int(cy + half), h)
+        if x2 - x1 < 8 or y2 - y1 < 8:
+            return None
+        return (x1, y1, x2, y2)
+
+    def reset(self):
+        self.box = None
+        self._missed = 0
@@ -0,0 +1,108 @@
+import math
+from collections import deque
+
+BASE_EVERY_N = 5  # Default cadence: one CNN run every N frames
+MAX_BACKOFF = 3  # Cadence multiplier ceiling while the driver is clearly alert
+ESCALATE_FRAMES = 30  # Frames to stay at full rate after an escalation trigger
+EAR_TREND_WINDOW = 5  # Frames used to detect a falling EAR
+EAR_TREND_DROP = 0.03  # EAR fall across the window that counts as eyes closing
+ALERT_EAR_MARGIN = 0.08  # EAR this far above the blink threshold counts as clearly open
+ALERT_STREAK = 5  # Consecutive non-drowsy verdicts before backing off
+STATS_WINDOW = 300
+
+
+class InferenceScheduler:
+    # Decides per frame whether the CNN is worth running. Cheap signals (EAR trend,
+    # face presence, last verdict) escalate to every frame; a run of confident
+    # non-drowsy verdicts with wide-open eyes backs the cadence off.
+    def __init__(self, every_n=BASE_EVERY_N, hz=None, ear_threshold=0.25, max_backoff=MAX_BACKOFF):
+        self.every_n = max(1, every_n)
+        self.hz = hz
+        self.ear_threshold = ear_threshold
+        self.max_backoff = max_backoff
+        self.backoff = 1
+        self.last_drowsy = False
+        self.last_reason = None
+        self.frames = 0
+        self.runs = 0
+        self._ears = deque(maxlen=EAR_TREND_WINDOW)
+        self._escalate_left = 0
+        self._alert_streak = 0
+        self._frames_since_run = math.inf
+        self._last_run_time = None
+        self._verdict_ages = deque(maxlen=STATS_WINDOW)
+
+    def _escalation_reason(self, ear):
+        if ear is None:
+            return "no_face"
+        if self.last_drowsy:
+            return "drowsy"
+        if ear < self.ear_threshold:
+            return "eyes_closing"
+        if len(self._ears) == self._ears.maxlen and self._ears[0] - self._ears[-1] >= EAR_TREND_DROP:
+            return "ear_falling"
+        return None
+
+    def _due(self, now):
+        if self._last_run_time is None:
+            return True
+        if self.hz:
+            return now - self._last_run_time >= self.backoff / self.hz
+        return self._frames_since_run >= self.every_n * self.backoff
+
+    def should_run(self, ear, now):
+        self.frames += 1
+        self._frames_since_run += 1
+        if ear is not None:
+            self._ears.append(ear)
+
+        reason = self._escalation_reason(ear)
+        if reason:
+            self.last_reason = reason
+            self._escalate_left = ESCALATE_FRAMES
+            self.backoff = 1
+
+        run = self._escalate_left > 0 or self._due(now)
+        if self._escalate_left > 0:
+            self._escalate_left -= 1
+        if not run:
+            self._verdict_ages.append(now - self._last_run_time)
+        return run
+
+    def record(self, drowsy, now):
+        self.runs += 1
+        self.last_drowsy = drowsy
+        self._frames_since_run = 0
+        self._last_run_time = now
+        self._verdict_ages.append(0.0)
+
+        if drowsy:
+            self._alert_streak = 0
+            self.backoff = 1
+            return
+        self._alert_streak += 1
+        clearly_open = self._ears and self._ears[-1] >= self.ear_threshold + ALERT_EAR_MARGIN
+        if self._alert_streak >= ALERT_STREAK and clearly_open:
+            self._alert_streak = 0
+            self.backoff = min(self.backoff + 1, self.max_backoff)
+
+    @property
+    def duty_cycle(self):
+        return self.runs / self.frames if self.frames else 0.0
+
+    def metrics(self):
+        # Verdict age: how old the CNN result applied to each frame was (0 when it ran on that frame)
+        ages = self._verdict_ages
+        return {
+            "cnn_duty_cycle": self.duty_cycle,
+            "cnn_runs": self.runs,
+            "frames": self.frames,
+            "backoff": self.backoff,
+            "verdict_age_mean_ms": (sum(ages) / len(ages) * 1000) if ages else 0.0,
+            "verdict_age_max_ms": (max(ages) * 1000) if ages else 0.0,
+        }
+
+    def summary(self):
+        m = self.metrics()
+        return (f"🧠 CNN duty cycle: {m['cnn_duty_cycle']:.0%} ({m['cnn_runs']}/{m['frames']} frames) | "
+                f"Verdict age mean: {m['verdict_age_mean_ms']:.0f} ms, max: {m['verdict_age_max_ms']:.0f} ms")
@@ -0,0 +1,322 @@
+import argparse
+import os
+import secrets
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from calibration import PROFILE_SETTINGS
+from camera import CAMERA_FPS, CAMERA_SIZE, parse_size
+from detection import MODEL_PATH, DrowsinessDetector
+from inference import BACKENDS
+from preview import PREVIEW_HZ, PREVIEW_WIDTH, PreviewPublisher
+from recorder import EVENTS_DIR, EventRecorder
+from roi import ROI_MODES
+from tracking import TRACK_MODES
+
+# Local control + telemetry channel: a Unix socket (named pipe on Windows). Connections must
+# present a random key that only the owning user can read, so other local users can connect
+# to the socket but can't send commands.
+if sys.platform == "win32":
+    SERVICE_ADDRESS = r"\\.\pipe\drowziguard"
+else:
+    SERVICE_ADDRESS = os.path.join(tempfile.gettempdir(), "drowziguard.sock")
+KEY_PATH = os.path.join(os.path.expanduser("~"), ".drowziguard", "service.key")
+TELEMETRY_HZ = 10  # Snapshots pushed to subscribers per second
+HISTORY = 600  # Snapshots kept for late subscribers and status requests (1 minute at 10 Hz)
+REPLY_TIMEOUT = 5.0
+RECONNECT_SECONDS = 1.0  # Pause before a telemetry feed retries a service that isn't up
+
+
+def load_authkey(create=False, path=KEY_PATH):
+    # Generated by the first service start with mode 0600 (owner only); clients only read it
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        if not create:
+            raise
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    key = secrets.token_bytes(32)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return load_authkey(path=path)  # Another service created it first
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+class DetectorService:
+    # Keeps one detector (model, FaceMesh, mixer) loaded for the lifetime of the process.
+    # Sessions run on the main thread (OpenCV windows need it); commands arrive on a listener thread.
+    def __init__(self, detector, address=SERVICE_ADDRESS, telemetry_hz=TELEMETRY_HZ):
+        self.detector = detector
+        self.detector.on_telemetry = self._on_telemetry
+        self.address = address
+        self.telemetry_interval = 1.0 / telemetry_hz
+        self.latest = {}
+        self.history = deque(maxlen=HISTORY)
+        self.sessions = 0
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._start_requested = threading.Event()
+        self._shutdown = False
+        if not sys.platform == "win32" and os.path.exists(address):
+            os.remove(address)  # Stale socket from a service that didn't exit cleanly
+        self.listener = Listener(address, authkey=load_authkey(create=True))
+
+    def serve_forever(self):
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        threading.Thread(target=self._publish_loop, daemon=True).start()
+        print(f"🛰️ Detector service listening on {self.address}")
+        try:
+            while not self._shutdown:
+                if not self._start_requested.wait(0.5):
+                    continue
+                self._start_requested.clear()
+                if self._shutdown:
+                    break
+                self.sessions += 1
+                self.latest = {}  # The last session's final frame isn't live data
+                print(f"▶️ Session {self.sessions} started")
+                self.detector.run()
+                print(f"⏹️ Session {self.sessions} stopped")
+        finally:
+            self.close()
+
+    def shutdown(self):
+        self._shutdown = True
+        self.detector.stop()
+        self._start_requested.set()
+
+    def close(self):
+        # Camera is released when run() returns; this frees FaceMesh, the mixer and the socket
+        self.detector.close()
+        with self._lock:
+            for conn in self._subscribers:
+                conn.close()
+            self._subscribers.clear()
+        self.listener.close()
+        if not sys.platform == "win32" and os.path.exists(self.address):
+            os.remove(self.address)
+        print("✅ Detector service shut down")
+
+    def snapshot(self):
+        detector = self.detector
+        sample = dict(self.latest)
+        sample.update(running=detector.running, starting=detector.active and not detector.running,
+                      paused=detector.paused, sessions=self.sessions,
+                      driver=detector.driver_id, blink_threshold=detector.blink_threshold,
+                      blink_duration_threshold=detector.blink_duration_threshold,
+                      head_thresholds=detector.head_thresholds)
+        if not detector.running or "status" not in sample:
+            sample["status"] = detector.status  # Stopped, or running but no frame has been rendered yet
+        return sample
+
+    def _on_telemetry(self, sample):
+        # Called from the detection loop on every frame: just swap the reference, never block
+        self.latest = sample
+
+    def _publish_loop(self):
+        # Throttled fan-out on its own thread, so a slow or stuck subscriber can't stall detection
+        last_key = None
+        while not self._shutdown:
+            time.sleep(self.telemetry_interval)
+            sample = self.snapshot()
+            key = (sample.get("frame"), sample["running"], sample["paused"], sample.get("status"))
+            if key == last_key:
+                continue
+            last_key = key
+            self.history.append(sample)
+            with self._lock:
+                subscribers = list(self._subscribers)
+            for conn in subscribers:
+                try:
+                    conn.send(sample)
+                except (OSError, EOFError, BrokenPipeError):
+                    with self._lock:
+                        self._subscribers.remove(conn)
+                    conn.close()
+
+    def _accept_loop(self):
+        while not self._shutdown:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                break  # Listener closed
+            except Exception as e:
+                print(f"⚠️ Rejected connection: {e}")
+                continue
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def _serve_connection(self, conn):
+        try:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    break
+                command = message.pop("command", None)
+                if command == "subscribe":
+                    conn.send({"ok": True, "history": list(self.history)})
+                    with self._lock:
+                        self._subscribers.append(conn)
+                    return  # The publisher owns the connection from now on
+                try:
+                    reply = self.handle(command, **message)
+                except (ValueError, TypeError) as e:
+                    reply = {"ok": False, "error": str(e)}
+                conn.send(reply)
+        except (OSError, EOFError):
+            pass
+        conn.close()
+
+    def handle(self, command, **kwargs):
+        detector = self.detector
+        if command == "start":
+            if not detector.begin_session():
+                return {"ok": False, "error": "Detection is already running"}
+            detector.paused = False
+            self._start_requested.set()
+        elif command == "stop":
+            detector.stop()
+            detector.paused = False
+        elif command == "pause":
+            detector.paused = True
+        elif command == "resume":
+            detector.paused = False
+        elif command == "configure":
+            detector.configure(**kwargs)
+            if set(kwargs) & set(PROFILE_SETTINGS):
+                detector.save_profile()  # Manual threshold adjustments stick to the current driver
+        elif command == "driver":
+            if not kwargs.get("driver_id"):
+                raise ValueError("driver_id is required")
+            detector.set_driver(kwargs["driver_id"], kwargs.get("recalibrate", False))
+        elif command == "shutdown":
+            self.shutdown()
+        elif command != "status":
+            raise ValueError(f"Unknown command '{command}'")
+        reply = {"ok": True, "state": self.snapshot()}
+        if command == "status" and kwargs.get("history"):
+            reply["history"] = list(self.history)
+        return reply
+
+
+class ServiceClient:
+    # One short-lived connection per command, so callers (e.g. Streamlit reruns) hold no state
+    def __init__(self, address=SERVICE_ADDRESS, timeout=REPLY_TIMEOUT):
+        self.address = address
+        self.timeout = timeout
+
+    def send(self, command, **kwargs):
+        with Client(self.address, authkey=load_authkey()) as conn:
+            conn.send({"command": command, **kwargs})
+            if not conn.poll(self.timeout):
+                raise TimeoutError(f"No reply to '{command}' within {self.timeout}s")
+            reply = conn.recv()
+        if not reply["ok"]:
+            raise RuntimeError(reply["error"])
+        return reply
+
+    def available(self):
+        try:
+            self.send("status")
+            return True
+        except (OSError, EOFError, TimeoutError):
+            return False
+
+    def status(self, history=False):
+        return self.send("status", history=history)
+
+    def telemetry(self):
+        # Yields snapshots at the service's telemetry rate until the service goes away
+        conn = Client(self.address, authkey=load_authkey())
+        try:
+            conn.send({"command": "subscribe"})
+            yield from conn.recv()["history"]
+            while True:
+                yield conn.recv()
+        except (EOFError, OSError):
+            return
+        finally:
+            conn.close()
+
+
+class TelemetryFeed:
+    # Holds one subscription open on a background thread, so dashboard refreshes read the latest
+    # snapshot from memory instead of opening a connection each time. Reconnects when the service
+    # (re)starts; `latest` is empty while it is down.
+    def __init__(self, client, history=HISTORY, reconnect_seconds=RECONNECT_SECONDS):
+        self.client = client
+        self.reconnect_seconds = reconnect_seconds
+        self.latest = {}
+        self.history = deque(maxlen=history)
+        self.connected = False
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _loop(self):
+        while True:
+            self.history.clear()  # The service replays its own history on subscribe
+            try:
+                for sample in self.client.telemetry():
+                    self.connected = True
+                    self.latest = sample
+                    self.history.append(sample)
+            except (OSError, EOFError, AuthenticationError):
+                pass  # Not running yet, or the key file isn't there
+            self.connected = False
+            self.latest = {}
+            time.sleep(self.reconnect_seconds)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Long-lived drowsiness detector controlled over a local socket")
+    parser.add_argument("--model", default=MODEL_PATH, help="Model file (.h5, .tflite or .onnx)")
+    parser.add_argument("--backend", choices=BACKENDS, help="Inference backend (default: inferred from the model file)")
+    parser.add_argument("--roi", choices=ROI_MODES, default="frame")
+    parser.add_argument("--track", choices=TRACK_MODES, default="off", help="FaceMesh on a tracked face crop")
+    parser.add_argument("--cnn-every", type=int, help="Adaptive scheduling: run the CNN every N frames")
+    parser.add_argument("--cnn-hz", type=float, help="Adaptive scheduling with a base cadence in Hz")
+    parser.add_argument("--fast-start", action="store_true", help="Prefer an up-to-date sibling .tflite model")
+    parser.add_argument("--camera", default="0", help="Webcam index, video file, stream URL or directory of images")
+    parser.add_argument("--camera-size", type=parse_size, default=CAMERA_SIZE, metavar="WxH")
+    parser.add_argument("--camera-fps", type=float, default=CAMERA_FPS)
+    parser.add_argument("--address", default=SERVICE_ADDRESS, help="Socket path (named pipe on Windows)")
+    parser.add_argument("--telemetry-hz", type=float, default=TELEMETRY_HZ)
+    parser.add_argument("--driver", help="Driver ID whose calibrated thresholds to load (or calibrate)")
+    parser.add_argument("--start", action="store_true", help="Start a detection session right away")
+    parser.add_argument("--headless", action="store_true", help="No OpenCV window (watch through the dashboard preview)")
+    parser.add_argument("--preview-hz", type=float, default=PREVIEW_HZ,
+                        help="Annotated frames shared with the dashboard per second (0 disables the preview)")
+    parser.add_argument("--preview-width", type=int, default=PREVIEW_WIDTH)
+    parser.add_argument("--record", nargs="?", const=EVENTS_DIR, metavar="DIR",
+                        help="Save footage and EAR/probability traces around each alert")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    detector = DrowsinessDetector(args.model, args.backend, args.roi, cnn_every=args.cnn_every, cnn_hz=args.cnn_hz,
+                                  fast_start=args.fast_start, display=not args.headless,
+                                  track=args.track)
+    if args.preview_hz > 0:
+        detector.preview = PreviewPublisher(args.preview_hz, args.preview_width)
+    detector.camera_options = {"source": args.camera, "size": args.camera_size, "fps": args.camera_fps}
+    detector.start_warmup()
+    if args.driver:
+        detector.set_driver(args.driver)
+    if args.record:
+        detector.recorder = EventRecorder(args.record, num_outputs=detector.backend.output_size)
+    service = DetectorService(detector, args.address, args.telemetry_hz)
+    # A terminate() from the dashboard still goes through the clean shutdown path
+    signal.signal(signal.SIGTERM, lambda *_: service.shutdown())
+    if args.start:
+        service.handle("start")
+    service.serve_forever()
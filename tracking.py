@@ -0,0 +1,121 @@
+import math
+
+import cv2
+import numpy as np
+
+from ear import landmarks_to_array
+
+TRACK_MODES = ("off", "crop", "skip")
+TRACK_SIZE = 256  # Side of the downscaled face crop FaceMesh runs on while tracking
+TRACK_MARGIN = 0.35  # Border around the landmark box, as a fraction of its size (room for head motion)
+RECENTER_FRACTION = 0.15  # Face-center drift, as a fraction of the crop, before the crop follows
+RESIZE_FRACTION = 0.2  # Face-size change before the crop is resized
+EDGE_MARGIN = 0.02  # Landmarks this close to the crop edge mean the face is leaving it
+STILL_PX = 1.5  # Mean landmark motion per frame (full-frame pixels) that counts as a still head
+MAX_SKIP = 1  # "skip" mode: consecutive frames that may reuse the last landmarks
+MIN_FACE_PX = 48  # Smaller crops go back to full-frame detection
+
+
+class FaceTracker:
+    # Runs FaceMesh on a square crop around the last known face, downscaled to TRACK_SIZE,
+    # instead of on the full frame. The crop stays put while the face stays near its center,
+    # so FaceMesh's own frame-to-frame tracking keeps working inside it. The detector falls
+    # back to a full-frame pass whenever track() returns None.
+    def __init__(self, mode="crop", size=TRACK_SIZE, margin=TRACK_MARGIN):
+        if mode not in TRACK_MODES[1:]:
+            raise ValueError(f"Unknown tracking mode '{mode}'. Choose from: {', '.join(TRACK_MODES[1:])}")
+        import mediapipe as mp
+        self.face_mesh = mp.solutions.face_mesh.FaceMesh(
+            max_num_faces=1,
+            refine_landmarks=True,
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5
+        )
+        self.mode = mode
+        self.size = size
+        self.margin = margin
+        self._crop = np.zeros((size, size, 3), dtype=np.uint8)
+        self.frames = 0
+        self.tracked = 0
+        self.skipped = 0
+        self.lost = 0
+        self.reset()
+
+    def reset(self):
+        self.box = None
+        self.landmarks = None
+        self.motion = math.inf
+        self._skip_run = 0
+
+    def start(self, landmarks, frame_shape):
+        # Called with the result of a full-frame pass (None when there was no face)
+        self.reset()
+        if landmarks is not None:
+            box = self._fit_box(landmarks, frame_shape)
+            if box[2] - box[0] >= MIN_FACE_PX:
+                self.landmarks = landmarks
+                self.box = box
+
+    def track(self, rgb, eyes_open=False):
+        # Landmarks in full-frame pixels, or None when there's no track or it was just lost
+        self.frames += 1
+        if self.box is None:
+            return None
+        if (self.mode == "skip" and eyes_open and self.motion < STILL_PX and self._skip_run < MAX_SKIP):
+            self._skip_run += 1
+            self.skipped += 1
+            return self.landmarks
+        self._skip_run = 0
+
+        x1, y1, x2, y2 = self.box
+        cv2.resize(rgb[y1:y2, x1:x2], (self.size, self.size), dst=self._crop, interpolation=cv2.INTER_AREA)
+        results = self.face_mesh.process(self._crop)
+        if not results.multi_face_landmarks:
+            self.lost += 1
+            self.reset()
+            return None
+
+        # Normalized crop coordinates -> full-frame pixels
+        side = x2 - x1
+        points = landmarks_to_array(results.multi_face_landmarks[0], side, side)
+        edge = EDGE_MARGIN * side
+        if (points[:, :2].min() < edge) or (points[:, :2].max() > side - edge):
+            self.lost += 1
+            self.reset()
+            return None  # Partly outside the crop: re-acquire on the full frame
+        points[:, 0] += x1
+        points[:, 1] += y1
+
+        if self.landmarks is not None:
+            self.motion = float(np.abs(points[:, :2] - self.landmarks[:, :2]).mean())
+        self.landmarks = points
+        self.tracked += 1
+        self._follow(points, rgb.shape)
+        return points
+
+    def _follow(self, points, frame_shape):
+        x1, y1, x2, y2 = self.box
+        side = x2 - x1
+        target = self._fit_box(points, frame_shape)
+        tx1, ty1, tx2, ty2 = target
+        drift = max(abs((tx1 + tx2) - (x1 + x2)), abs((ty1 + ty2) - (y1 + y2))) / 2
+        if drift > RECENTER_FRACTION * side or abs(tx2 - tx1 - side) > RESIZE_FRACTION * side:
+            self.box = target
+
+    def _fit_box(self, points, frame_shape):
+        # Square (so the downscale doesn't distort the face), shifted rather than clipped at frame edges
+        h, w = frame_shape[:2]
+        (x_min, y_min), (x_max, y_max) = points[:, :2].min(axis=0), points[:, :2].max(axis=0)
+        side = int(min(max(x_max - x_min, y_max - y_min) * (1 + 2 * self.margin), w, h))
+        x1 = int(min(max((x_min + x_max) / 2 - side / 2, 0), w - side))
+        y1 = int(min(max((y_min + y_max) / 2 - side / 2, 0), h - side))
+        return (x1, y1, x1 + side, y1 + side)
+
+    def summary(self):
+        if not self.frames:
+            return "🎯 Face tracking: no frames"
+        return (f"🎯 Face tracking: {self.tracked / self.frames:.0%} of frames on {self.size}px crops, "
+                f"{self.skipped / self.frames:.0%} reused, {self.lost} re-acquisitions")
+
+    def close(self):
+        self.face_mesh.close()